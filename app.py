@@ -1,17 +1,173 @@
 import dash
 from dash import dcc, html, dash_table, Input, Output, State, callback
+import flask
+from flask import jsonify
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io
+import plotly.utils
 import pandas as pd
 import base64
+import codecs
+import cProfile
+import functools
+import hashlib
 import io
+import json
+import multiprocessing
+import pickle
+import pstats
+import tempfile
 import numpy as np
 import traceback
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qs
 from datetime import datetime
 
-# Инициализация приложения
-app = dash.Dash(__name__)
-server = app.server
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+try:
+    import flask_compress
+except ImportError:
+    flask_compress = None
+
+try:
+    import diskcache
+    import multiprocess
+    from dash import DiskcacheManager
+except ImportError:
+    diskcache = None
+
+# Инициализация приложения. Ответы сжимаются (brotli или gzip по Accept-Encoding), если
+# установлен flask-compress; FLEET_COMPRESS=0 отключает сжатие
+COMPRESS_RESPONSES = flask_compress is not None and os.environ.get('FLEET_COMPRESS', '1') != '0'
+server = flask.Flask(__name__)
+server.config.update(
+    COMPRESS_ALGORITHM=os.environ.get('FLEET_COMPRESS_ALGORITHMS', 'br,gzip').split(','),
+    COMPRESS_BR_LEVEL=int(os.environ.get('FLEET_COMPRESS_BR_LEVEL', '5')),
+    COMPRESS_LEVEL=6,
+    COMPRESS_MIN_SIZE=1024
+)
+app = dash.Dash(__name__, server=server, compress=COMPRESS_RESPONSES)
+
+# Метрики горячих путей: гистограммы длительности этапов и размера ответов,
+# отдаются на /metrics в текстовом формате Prometheus (значения по процессу-воркеру)
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864]
+METRICS = {
+    'fleet_stage_duration_seconds': ('stage', 'Длительность этапов обработки', DURATION_BUCKETS),
+    'fleet_response_size_bytes': ('callback', "Размер ответов callback'ов Dash", SIZE_BUCKETS)
+}
+
+_histograms = {name: {} for name in METRICS}
+_metrics_lock = threading.Lock()
+
+def observe(metric, label, value):
+    buckets = METRICS[metric][2]
+    with _metrics_lock:
+        series = _histograms[metric].get(label)
+        if series is None:
+            series = _histograms[metric][label] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series['buckets'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+# Замер этапа; работает и как контекстный менеджер, и как декоратор
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('fleet_stage_duration_seconds', stage, time.perf_counter() - started)
+
+def render_metrics():
+    lines = []
+    with _metrics_lock:
+        for metric, (label_name, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for label, series in sorted(_histograms[metric].items()):
+                label_value = label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                for bound, count in zip(buckets, series['buckets']):
+                    lines.append(f'{metric}_bucket{{{label_name}="{label_value}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{{label_name}="{label_value}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{metric}_sum{{{label_name}="{label_value}"}} {series["sum"]}')
+                lines.append(f'{metric}_count{{{label_name}="{label_value}"}} {series["count"]}')
+    
+    figure_stats = get_figure_cache_stats()
+    lines.append("# HELP fleet_figure_cache_requests_total Обращения к кэшу графиков")
+    lines.append("# TYPE fleet_figure_cache_requests_total counter")
+    for result in ['memory_hits', 'disk_hits', 'misses']:
+        lines.append(f'fleet_figure_cache_requests_total{{result="{result}"}} {figure_stats[result]}')
+    lines.append("# HELP fleet_figure_cache_bytes Объем кэша графиков в памяти")
+    lines.append("# TYPE fleet_figure_cache_bytes gauge")
+    lines.append(f"fleet_figure_cache_bytes {figure_stats['bytes']}")
+    
+    with _dataset_cache_lock:
+        dataset_entries, dataset_bytes = len(_dataset_cache), _dataset_cache_bytes
+    lines.append("# HELP fleet_dataset_cache_bytes Объем наборов данных в памяти")
+    lines.append("# TYPE fleet_dataset_cache_bytes gauge")
+    lines.append(f"fleet_dataset_cache_bytes {dataset_bytes}")
+    lines.append("# HELP fleet_dataset_cache_entries Число наборов данных в памяти")
+    lines.append("# TYPE fleet_dataset_cache_entries gauge")
+    lines.append(f"fleet_dataset_cache_entries {dataset_entries}")
+    return "\n".join(lines) + "\n"
+
+@server.route('/metrics')
+def metrics():
+    return flask.Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@server.after_request
+def record_response_size(response):
+    if flask.request.path.endswith('/_dash-update-component') and not response.direct_passthrough:
+        # Callback с несколькими выходами подписываем по первому из них. Метка берется только
+        # из зарегистрированных callback'ов: строка из тела запроса не должна порождать новые серии
+        body = flask.request.get_json(silent=True) or {}
+        output = body.get('output') if isinstance(body, dict) else None
+        known = isinstance(output, str) and output in app.callback_map
+        label = output.strip('.').split('...')[0] if known else 'unknown'
+        observe('fleet_response_size_bytes', label, response.calculate_content_length() or 0)
+    return response
+
+# Профилирование отдельного callback'а: FLEET_PROFILE=имя1,имя2 профилирует каждый вызов,
+# а при любом значении FLEET_PROFILE запрос с заголовком X-Fleet-Profile: <имя> профилирует один вызов
+PROFILE_SETTING = os.environ.get('FLEET_PROFILE', '')
+PROFILE_CALLBACKS = {name.strip() for name in PROFILE_SETTING.split(',') if name.strip()}
+PROFILE_DIR = os.environ.get('FLEET_PROFILE_DIR', tempfile.gettempdir())
+
+def profiled(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        requested = None
+        if PROFILE_SETTING and flask.has_request_context():
+            requested = flask.request.headers.get('X-Fleet-Profile')
+        if func.__name__ not in PROFILE_CALLBACKS and requested != func.__name__:
+            return func(*args, **kwargs)
+        
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            path = os.path.join(PROFILE_DIR, f"{func.__name__}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+            profiler.dump_stats(path)
+            print(f"Профиль {func.__name__} сохранен в {path}")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    return wrapper
 
 # Создаем пример данных для отображения при запуске
 sample_data = pd.DataFrame({
@@ -27,7 +183,697 @@ sample_data = pd.DataFrame({
     'vehicle_age': [3, 5, 2, 4, 1]
 })
 
+# Компактное колоночное представление: категории для текста с малым числом значений,
+# минимальные числовые типы и предрасчитанные флаги статусов
+CATEGORICAL_COLUMNS = ['vehicle_id', 'vehicle_type', 'status', 'maintenance_status']
+CATEGORICAL_MAX_RATIO = 0.5
+
+# Уже компактные колонки (например, части файла, нормализованные при чтении) не копируются:
+# новая колонка сохраняется, только если изменился тип или набор категорий
+@timed('normalize')
+def normalize_fleet_df(df):
+    df = df.reset_index(drop=True)
+    normalized = {}
+    
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            used = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+            if not used.all():
+                series = series.cat.remove_unused_categories()
+            if not series.cat.categories.is_monotonic_increasing:
+                series = series.cat.reorder_categories(series.cat.categories.sort_values())
+        elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            series = compact_numeric(series, 'integer')
+        elif pd.api.types.is_float_dtype(series):
+            # Целые значения (пробег, затраты) храним целыми, остальное во float32
+            series = compact_numeric(series, 'integer')
+            if pd.api.types.is_float_dtype(series):
+                series = compact_numeric(series, 'float')
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if col in CATEGORICAL_COLUMNS or series.nunique() <= CATEGORICAL_MAX_RATIO * len(series):
+                series = series.astype('category')
+        normalized[col] = series
+    
+    return pd.DataFrame(normalized, copy=False)
+
+def compact_numeric(series, downcast):
+    compact = pd.to_numeric(series, downcast=downcast)
+    return series if compact.dtype == series.dtype else compact
+
+# Строковая проверка: для категориальных колонок считается только по категориям
+def category_mask(series, predicate):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = pd.Series(series.cat.categories.astype(str))
+        category_mask = predicate(categories).to_numpy(dtype=bool)
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_mask[codes], False)
+    return predicate(series.astype(str)).to_numpy(dtype=bool)
+
+def status_flags(df):
+    flags = {}
+    if 'status' in df.columns:
+        flags['working'] = category_mask(df['status'], lambda s: s.str.contains('работе', case=False, na=False))
+    return flags
+
+# Число уникальных ТС: для категориальной колонки по кодам без сравнения строк
+def count_vehicles(df):
+    vehicle_ids = df['vehicle_id']
+    if isinstance(vehicle_ids.dtype, pd.CategoricalDtype):
+        codes = vehicle_ids.cat.codes.to_numpy()
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0])))
+    return int(vehicle_ids.nunique())
+
+# Итоги для KPI: суммы и счетчики, из которых показатели получаются без прохода по строкам
+def dataset_totals(df, flags):
+    totals = {'rows': len(df)}
+    
+    if 'vehicle_id' in df.columns:
+        totals['vehicles'] = count_vehicles(df)
+    
+    if 'mileage' in df.columns:
+        mileage = df['mileage'].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(mileage)
+        totals['mileage_sum'] = float(mileage[valid].sum())
+        totals['mileage_count'] = int(valid.sum())
+    
+    for col in ['fuel_cost', 'maintenance_cost']:
+        if col in df.columns:
+            totals[f'{col}_sum'] = float(np.nansum(df[col].to_numpy(dtype=np.float64, na_value=np.nan)))
+    
+    if 'working' in flags:
+        totals['working'] = int(np.count_nonzero(flags['working']))
+    
+    return totals
+
+# Предрасчитанные агрегаты по периодам: коды периодов считаются один раз при загрузке
+PERIODS = ['year', 'month', 'quarter', 'week']
+GROUPING_COLUMNS = ['vehicle_id', 'vehicle_type', 'maintenance_status']
+
+def period_codes(dates):
+    years = dates.dt.year.to_numpy(dtype=np.int32)
+    months = dates.dt.month.to_numpy(dtype=np.int32)
+    iso = dates.dt.isocalendar()
+    return {
+        'year': years,
+        'month': years * 12 + months - 1,
+        'quarter': years * 4 + (months - 1) // 3,
+        'week': iso['year'].to_numpy(dtype=np.int32) * 100 + iso['week'].to_numpy(dtype=np.int32)
+    }
+
+# Подписи строятся только для уникальных кодов, а не для каждой строки
+def period_labels(period, codes):
+    if period == 'year':
+        return [str(code) for code in codes]
+    if period == 'month':
+        return [f"{code // 12}-{code % 12 + 1:02d}" for code in codes]
+    if period == 'quarter':
+        return [f"{code // 4}Q{code % 4 + 1}" for code in codes]
+    if period == 'week':
+        return [f"{code % 100}-{code // 100}" for code in codes]
+    return [str(code) for code in codes]
+
+# Уникальные коды и номера групп 0..k-1, как np.unique(return_inverse=True). Коды дней,
+# периодов и категорий занимают узкий диапазон, поэтому вместо сортировки - таблица по диапазону
+def dense_codes(codes):
+    if not len(codes):
+        return np.array([], dtype=np.int64), np.array([], dtype=np.intp)
+    low, high = int(codes.min()), int(codes.max())
+    if high - low > 4 * len(codes):
+        return np.unique(codes, return_inverse=True)
+    offsets = np.asarray(codes, dtype=np.intp) - low
+    present = np.bincount(offsets, minlength=high - low + 1) > 0
+    lookup = np.cumsum(present) - 1
+    return low + np.flatnonzero(present), lookup[offsets]
+
+# Суммы и счетчики по группам: среднее считается как сумма / количество
+def aggregate_by_codes(df, codes, index):
+    groups = dense_codes(codes)[1]
+    size = len(index)
+    columns = {'rows': np.bincount(groups, minlength=size)}
+    
+    for col in ['mileage', 'fuel_consumption']:
+        if col in df.columns:
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = ~np.isnan(values)
+            # Без пропусков (после заполнения при загрузке) обходимся без копий по маске
+            value_groups = groups
+            if not valid.all():
+                value_groups, values = groups[valid], values[valid]
+            columns[f'{col}_sum'] = np.bincount(value_groups, weights=values, minlength=size)
+            columns[f'{col}_count'] = np.bincount(value_groups, minlength=size)
+    
+    for col in ['fuel_cost', 'maintenance_cost']:
+        if col in df.columns:
+            values = np.nan_to_num(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+            columns[f'{col}_sum'] = np.bincount(groups, weights=values, minlength=size)
+    
+    if 'status' in df.columns:
+        status_codes, statuses = pd.factorize(df['status'], use_na_sentinel=True)
+        valid = status_codes >= 0
+        combined = groups * len(statuses)
+        combined += status_codes
+        counts = np.bincount(
+            combined if valid.all() else combined[valid],
+            minlength=size * len(statuses)
+        ).reshape(size, len(statuses))
+        for i, status in enumerate(statuses):
+            columns[f'status={status}'] = counts[:, i]
+    
+    return pd.DataFrame(columns, index=index)
+
+@timed('aggregate')
+def build_period_cube(df):
+    cube = {}
+    
+    if has_dates(df):
+        valid = df['date'].notna().to_numpy()
+        if valid.any():
+            subset = df[valid] if not valid.all() else df
+            # Сначала суммы по дням, затем дни складываются в периоды: коды периодов
+            # считаются по уникальным дням, а не по каждой строке
+            day_codes = subset['date'].to_numpy().astype('datetime64[D]').view(np.int64)
+            days = dense_codes(day_codes)[0].astype('datetime64[D]')
+            daily = aggregate_by_codes(subset, day_codes, pd.RangeIndex(len(days)))
+            for period, frame in regroup_days(daily.to_numpy(dtype=np.float64), daily.columns, days).items():
+                cube[period] = frame.astype(daily.dtypes.to_dict())
+    
+    # Группировки по значениям колонок: vehicle_id нужен динамике без даты,
+    # тип ТС и статус ТО - графикам распределений
+    for col in GROUPING_COLUMNS:
+        if col in df.columns:
+            codes, values = pd.factorize(df[col], sort=True, use_na_sentinel=False)
+            cube[col] = aggregate_by_codes(df, codes, pd.Index(np.asarray(values), name=col))
+    
+    return cube
+
+# Сложение сумм по дням в суммы по периодам: все агрегаты аддитивны
+def regroup_days(values, columns, days):
+    cube = {}
+    for period, codes in period_codes(pd.Series(days)).items():
+        uniques, groups = np.unique(codes, return_inverse=True)
+        sums = np.zeros((len(uniques), values.shape[1]))
+        np.add.at(sums, groups, values)
+        cube[period] = pd.DataFrame(sums, index=pd.Index(uniques, name=period), columns=columns)
+    return cube
+
+# Инкрементальное обновление агрегатов: вычитаем замененные строки и добавляем новые.
+# Суммы и счетчики аддитивны, поэтому результат совпадает с полным пересчетом
+def merge_period_cubes(base, removed, added):
+    merged = {}
+    for name in set(base) | set(added):
+        frame = base.get(name)
+        if frame is None:
+            frame = added[name]
+        elif name in added:
+            frame = frame.add(added[name], fill_value=0)
+        if name in removed:
+            frame = frame.sub(removed[name], fill_value=0)
+        merged[name] = frame[frame['rows'] > 0].fillna(0).sort_index()
+    return merged
+
+def merge_totals(base, removed, added):
+    merged = {}
+    for name in set(base) | set(added):
+        merged[name] = base.get(name, 0) + added.get(name, 0) - removed.get(name, 0)
+    return merged
+
+# Средний пробег по выбранному периоду из предрасчитанных агрегатов
+def period_mileage(entry, period):
+    cube = entry['periods']
+    if period in cube:
+        period_col = period
+        aggregates = cube[period]
+        x_values = period_labels(period, aggregates.index)
+    elif 'vehicle_id' in cube:
+        period_col = 'vehicle_id'
+        aggregates = cube['vehicle_id']
+        x_values = list(aggregates.index)
+    else:
+        df = entry['df']
+        return 'index', pd.DataFrame({'index': range(len(df)), 'mileage': df['mileage'].to_numpy()})
+    
+    if 'mileage_sum' not in aggregates.columns:
+        return period_col, pd.DataFrame(columns=[period_col, 'mileage'])
+    
+    counts = aggregates['mileage_count'].to_numpy()
+    present = counts > 0
+    mileage = aggregates['mileage_sum'].to_numpy()[present] / counts[present]
+    x_values = [x for x, keep in zip(x_values, present) if keep]
+    return period_col, pd.DataFrame({period_col: x_values, 'mileage': mileage})
+
+# Окно дат. Набор хранится отсортированным по date (NaT в конце), поэтому окно - непрерывный
+# диапазон строк, который находится двоичным поиском по дням. Итоги окна - разность
+# накопленных сумм по дням, агрегаты периодов собираются только из дней окна
+WINDOW_GROUPING_COLUMNS = ['vehicle_type', 'maintenance_status']
+WINDOW_CACHE_SIZE = 8
+
+_window_lock = threading.Lock()
+
+def has_dates(df):
+    return 'date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['date'])
+
+def sort_by_date(df):
+    if not has_dates(df) or df['date'].is_monotonic_increasing:
+        return df
+    return df.sort_values('date', kind='stable', na_position='last', ignore_index=True)
+
+# Накопленные суммы: строка i - итоги всех дней до i-го, итог окна [lo, hi) - cumulative[hi] - cumulative[lo]
+def cumulative_sums(values):
+    cumulative = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=cumulative[1:])
+    return cumulative
+
+# Индекс дат: уникальные дни, смещения их первых строк и суммы по дням - общие
+# и в разрезе колонок распределений (день x значение)
+@timed('date_index')
+def build_date_index(df, flags):
+    valid_count = int(df['date'].notna().sum())
+    subset = df.iloc[:valid_count]
+    days, starts = np.unique(subset['date'].to_numpy().astype('datetime64[D]'), return_index=True)
+    offsets = np.append(starts, valid_count)
+    day_codes = np.repeat(np.arange(len(days)), np.diff(offsets))
+    
+    daily = aggregate_by_codes(subset, day_codes, pd.RangeIndex(len(days)))
+    if 'working' in flags:
+        daily['working'] = np.bincount(day_codes, weights=flags['working'][:valid_count], minlength=len(days))
+    daily_values = daily.to_numpy(dtype=np.float64)
+    
+    groups = {}
+    for col in WINDOW_GROUPING_COLUMNS:
+        if col not in subset.columns:
+            continue
+        codes, values = pd.factorize(subset[col], sort=True, use_na_sentinel=False)
+        size = len(values)
+        combined = day_codes * size + codes
+        present = np.unique(combined)
+        frame = aggregate_by_codes(subset, combined, pd.Index(present))
+        dense = np.zeros((len(days) * size, frame.shape[1]))
+        dense[present] = frame.to_numpy(dtype=np.float64)
+        groups[col] = {
+            'index': pd.Index(np.asarray(values), name=col),
+            'columns': list(frame.columns),
+            'cumulative': cumulative_sums(dense.reshape(len(days), size, frame.shape[1]))
+        }
+    
+    return {
+        'days': days,
+        'offsets': offsets,
+        'columns': list(daily.columns),
+        'daily': daily_values,
+        'cumulative': cumulative_sums(daily_values),
+        'groups': groups
+    }
+
+# Индекс строится при первом обращении и хранится в записи набора; None, если дат нет
+def date_index(entry):
+    if 'date_index' not in entry:
+        df = entry['df']
+        has_valid = has_dates(df) and bool(df['date'].notna().any())
+        entry['date_index'] = build_date_index(df, entry['flags']) if has_valid else None
+    return entry['date_index']
+
+# Первый и последний день набора для выбора окна, None если дат нет
+def date_bounds(entry):
+    index = date_index(entry)
+    if index is None:
+        return None
+    return str(index['days'][0]), str(index['days'][-1])
+
+def parse_window_date(value):
+    if not value:
+        return None
+    return np.datetime64(str(value)[:10], 'D')
+
+def format_day(day):
+    return pd.Timestamp(day).strftime('%d.%m.%Y')
+
+# Запись набора, ограниченная днями [lo, hi): того же вида, что и полная, поэтому графики,
+# KPI и таблица строятся по ней теми же функциями. Строки - срез без копирования
+@timed('window')
+def build_window(entry, index, lo, hi, key):
+    offsets = index['offsets']
+    row_lo, row_hi = int(offsets[lo]), int(offsets[hi])
+    df = entry['df'].iloc[row_lo:row_hi]
+    flags = {name: flag[row_lo:row_hi] for name, flag in entry['flags'].items()}
+    
+    sums = dict(zip(index['columns'], index['cumulative'][hi] - index['cumulative'][lo]))
+    totals = {'rows': row_hi - row_lo}
+    for name in entry['totals']:
+        if name == 'vehicles':
+            totals[name] = count_vehicles(df)
+        elif name in ('mileage_count', 'working'):
+            totals[name] = int(round(sums[name]))
+        elif name in sums and name != 'rows':
+            totals[name] = float(sums[name])
+    
+    periods = regroup_days(index['daily'][lo:hi], index['columns'], index['days'][lo:hi])
+    for col, group in index['groups'].items():
+        periods[col] = pd.DataFrame(group['cumulative'][hi] - group['cumulative'][lo],
+                                    index=group['index'], columns=group['columns'])
+    
+    days = index['days']
+    return {
+        'key': key,
+        'df': df,
+        'nbytes': entry['nbytes'],
+        'periods': periods,
+        'flags': flags,
+        'totals': totals,
+        'window': {
+            'rows': entry['totals']['rows'],
+            'label': f"{format_day(days[lo])} – {format_day(days[hi - 1])}" if hi > lo else None
+        }
+    }
+
+# Набор за окно дат (границы включительно, пустая граница - без ограничения).
+# Ключ окна задается номерами дней, поэтому разные даты с тем же набором дней
+# делят одну запись и один кэш графиков
+def dataset_window(entry, start_date=None, end_date=None):
+    start, end = parse_window_date(start_date), parse_window_date(end_date)
+    if start is None and end is None:
+        return entry
+    index = date_index(entry)
+    if index is None:
+        return entry
+    
+    days = index['days']
+    lo = int(np.searchsorted(days, start, side='left')) if start is not None else 0
+    hi = int(np.searchsorted(days, end, side='right')) if end is not None else len(days)
+    hi = max(lo, hi)
+    key = f"{entry['key']}@{lo}:{hi}"
+    
+    with _window_lock:
+        windows = entry.setdefault('windows', OrderedDict())
+        window = windows.get(key)
+        if window is not None:
+            windows.move_to_end(key)
+            return window
+    
+    window = build_window(entry, index, lo, hi, key)
+    with _window_lock:
+        windows[key] = window
+        while len(windows) > WINDOW_CACHE_SIZE:
+            windows.popitem(last=False)
+    return window
+
+# Серверный реестр наборов данных: в dcc.Store хранится только ключ,
+# а DataFrame остается в памяти процесса в LRU-кэше с лимитом по объему
+DATASET_CACHE_MAX_BYTES = int(os.environ.get('FLEET_DATASET_CACHE_MB', '512')) * 1024 * 1024
+SAMPLE_DATASET_KEY = 'sample'
+DATASET_EXPIRED_MESSAGE = "Набор данных устарел и был выгружен из памяти сервера. Пожалуйста, загрузите файл повторно."
+
+_dataset_cache = OrderedDict()
+_dataset_cache_bytes = 0
+_dataset_cache_lock = threading.Lock()
+
+def format_bytes(nbytes):
+    if nbytes < 1024 * 1024:
+        return f"{nbytes / 1024:.1f} КБ"
+    return f"{nbytes / 1024 / 1024:.1f} МБ"
+
+def dataframe_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+# Нормализация и все производные структуры набора данных
+def build_dataset_entry(key, df):
+    df = sort_by_date(normalize_fleet_df(df))
+    flags = status_flags(df)
+    return {
+        'key': key,
+        'df': df,
+        'nbytes': dataframe_nbytes(df) + sum(flag.nbytes for flag in flags.values()),
+        'periods': build_period_cube(df),
+        'flags': flags,
+        'totals': dataset_totals(df, flags)
+    }
+
+# Дозапись новых строк к существующему набору с удалением дублей по (date, vehicle_id).
+# Агрегаты и итоги обновляются по разнице, а не пересчитываются по всему набору
+@timed('append')
+def append_to_dataset(base, new_df, key):
+    base_df = base['df']
+    new_df = normalize_fleet_df(new_df)
+    
+    replaced = np.zeros(len(base_df), dtype=bool)
+    if all(col in df.columns for df in (base_df, new_df) for col in ('date', 'vehicle_id')):
+        new_keys = pd.MultiIndex.from_arrays([new_df['date'], new_df['vehicle_id'].astype(str)])
+        duplicated = new_keys.duplicated(keep='last')
+        if duplicated.any():
+            new_df = new_df[~duplicated].reset_index(drop=True)
+            new_keys = new_keys[~duplicated]
+        base_keys = pd.MultiIndex.from_arrays([base_df['date'], base_df['vehicle_id'].astype(str)])
+        replaced = base_keys.isin(new_keys)
+    
+    removed_df = base_df[replaced]
+    kept_df = base_df[~replaced] if replaced.any() else base_df
+    
+    # Объединяем категории заранее, чтобы concat сохранил категориальные колонки
+    for col in set(kept_df.columns) & set(new_df.columns):
+        if isinstance(kept_df[col].dtype, pd.CategoricalDtype) and isinstance(new_df[col].dtype, pd.CategoricalDtype):
+            categories = kept_df[col].cat.categories.union(new_df[col].cat.categories)
+            kept_df = kept_df.assign(**{col: kept_df[col].cat.set_categories(categories)})
+            new_df = new_df.assign(**{col: new_df[col].cat.set_categories(categories)})
+    df = sort_by_date(normalize_fleet_df(pd.concat([kept_df, new_df], ignore_index=True)))
+    
+    removed_flags = status_flags(removed_df)
+    added_flags = status_flags(new_df)
+    periods = merge_period_cubes(base['periods'], build_period_cube(removed_df), build_period_cube(new_df))
+    totals = merge_totals(base['totals'], dataset_totals(removed_df, removed_flags), dataset_totals(new_df, added_flags))
+    totals['rows'] = len(df)
+    if 'vehicle_id' in periods:
+        totals['vehicles'] = len(periods['vehicle_id'])
+    
+    flags = status_flags(df)
+    print(f"Добавлено {len(new_df)} строк, заменено {int(replaced.sum())}, итого {len(df)}")
+    return {
+        'key': key,
+        'df': df,
+        'nbytes': dataframe_nbytes(df) + sum(flag.nbytes for flag in flags.values()),
+        'periods': periods,
+        'flags': flags,
+        'totals': totals
+    }
+
+# Добавление готовой записи в LRU-кэш памяти
+def _cache_entry(entry):
+    global _dataset_cache_bytes
+    
+    with _dataset_cache_lock:
+        previous = _dataset_cache.pop(entry['key'], None)
+        if previous is not None:
+            _dataset_cache_bytes -= previous['nbytes']
+        _dataset_cache[entry['key']] = entry
+        _dataset_cache_bytes += entry['nbytes']
+        
+        # Вытесняем давно не использованные наборы, последний добавленный оставляем всегда
+        while _dataset_cache_bytes > DATASET_CACHE_MAX_BYTES and len(_dataset_cache) > 1:
+            evicted_key, evicted = _dataset_cache.popitem(last=False)
+            _dataset_cache_bytes -= evicted['nbytes']
+            print(f"Набор данных {evicted_key} вытеснен из кэша ({evicted['nbytes'] / 1024 / 1024:.1f} МБ)")
+
+# Сохранение набора данных в реестре, возвращает ключ для dcc.Store.
+# С persist=True нормализованный набор также пишется в дисковый кэш
+def register_dataset(df, key=None, persist=False):
+    key = key or uuid.uuid4().hex
+    store_dataset(build_dataset_entry(key, df), persist)
+    return key
+
+def store_dataset(entry, persist=False):
+    if persist and save_dataset_to_disk(entry):
+        # В памяти держим отображенную с диска копию: ее страницы общие для всех воркеров
+        shared = load_dataset_from_disk(entry['key'])
+        if shared is not None:
+            entry = shared
+    _cache_entry(entry)
+
+# Получение набора данных по ключу, None если он был вытеснен
+def get_dataset(key):
+    if not key:
+        return None
+    
+    with _dataset_cache_lock:
+        entry = _dataset_cache.get(key)
+        if entry is not None:
+            _dataset_cache.move_to_end(key)
+    if entry is not None:
+        touch_disk_cache(key)
+        return entry
+    
+    # Пример данных всегда можно восстановить
+    if key == SAMPLE_DATASET_KEY:
+        register_dataset(sample_data.copy(), SAMPLE_DATASET_KEY)
+        return get_dataset(key)
+    
+    # Наборы, вытесненные из памяти или загруженные другим процессом, ищем на диске
+    entry = load_dataset_from_disk(key)
+    if entry is not None:
+        _cache_entry(entry)
+    return entry
+
+# Дисковый кэш нормализованных наборов в формате Arrow IPC, адресуемый по содержимому файла.
+# Файлы без сжатия, поэтому читаются через memory map и разделяются между процессами
+DISK_CACHE_DIR = os.environ.get('FLEET_DISK_CACHE_DIR',
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fleet_cache'))
+DISK_CACHE_MAX_BYTES = int(os.environ.get('FLEET_DISK_CACHE_MB', '2048')) * 1024 * 1024
+# Меняется при изменении формата нормализации, чтобы не читать устаревшие файлы
+# (2 - строки отсортированы по дате)
+DISK_CACHE_VERSION = 2
+
+def content_hasher():
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"fleet-v{DISK_CACHE_VERSION}:".encode())
+    return digest
+
+def content_key(data):
+    digest = content_hasher()
+    digest.update(data)
+    return digest.hexdigest()
+
+def _disk_cache_paths(key):
+    return (os.path.join(DISK_CACHE_DIR, f"{key}.arrow"),
+            os.path.join(DISK_CACHE_DIR, f"{key}.meta.pkl"))
+
+@timed('disk_cache_save')
+def save_dataset_to_disk(entry):
+    if pa is None or not re.fullmatch(r'[0-9a-f]+', entry['key']):
+        return False
+    
+    data_path, meta_path = _disk_cache_paths(entry['key'])
+    meta = {name: entry[name] for name in ('periods', 'flags', 'totals')}
+    try:
+        os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+        # Пишем во временные файлы и атомарно переименовываем: другие процессы не увидят половину файла
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        feather.write_feather(entry['df'], data_path + suffix, compression='uncompressed')
+        with open(meta_path + suffix, 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(meta_path + suffix, meta_path)
+        os.replace(data_path + suffix, data_path)
+    except Exception as e:
+        print(f"Не удалось сохранить набор данных в дисковый кэш: {e}")
+        return False
+    
+    evict_disk_cache()
+    return True
+
+@timed('disk_cache_load')
+def load_dataset_from_disk(key):
+    if pa is None or not re.fullmatch(r'[0-9a-f]+', key):
+        return None
+    
+    data_path, meta_path = _disk_cache_paths(key)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    
+    try:
+        started = time.perf_counter()
+        table = feather.read_table(data_path, memory_map=True)
+        # split_blocks позволяет числовым колонкам ссылаться на отображенный файл без копирования
+        df = table.to_pandas(split_blocks=True)
+        with open(meta_path, 'rb') as f:
+            meta = pickle.load(f)
+    except Exception as e:
+        print(f"Не удалось прочитать набор данных {key} из дискового кэша: {e}")
+        return None
+    
+    print(f"Набор данных {key} загружен из дискового кэша за {(time.perf_counter() - started) * 1000:.0f} мс")
+    touch_disk_cache(key, force=True)
+    return {
+        'key': key,
+        'df': df,
+        'nbytes': dataframe_nbytes(df) + sum(flag.nbytes for flag in meta['flags'].values()),
+        **meta
+    }
+
+# Время изменения файлов - время последнего доступа для LRU-вытеснения. Обращения к набору
+# в памяти тоже обновляют его, но не чаще раза в DISK_CACHE_TOUCH_SECONDS на ключ
+DISK_CACHE_TOUCH_SECONDS = 60
+_disk_cache_touched = {}
+_disk_cache_touch_lock = threading.Lock()
+
+def touch_disk_cache(key, force=False):
+    if not re.fullmatch(r'[0-9a-f]+', key):
+        return
+    now = time.time()
+    with _disk_cache_touch_lock:
+        if not force and now - _disk_cache_touched.get(key, 0) < DISK_CACHE_TOUCH_SECONDS:
+            return
+        _disk_cache_touched[key] = now
+    for path in _disk_cache_paths(key):
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+# Удаление давно не использованных файлов, пока кэш превышает лимит
+def evict_disk_cache():
+    try:
+        files = []
+        for name in os.listdir(DISK_CACHE_DIR):
+            if name.endswith('.arrow'):
+                key = name[:-len('.arrow')]
+                paths = _disk_cache_paths(key)
+                size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+                files.append((os.path.getmtime(paths[0]), size, key))
+    except OSError as e:
+        print(f"Ошибка при обходе дискового кэша: {e}")
+        return
+    
+    total = sum(size for _, size, _ in files)
+    for _, size, key in sorted(files):
+        if total <= DISK_CACHE_MAX_BYTES:
+            break
+        for path in _disk_cache_paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        with _disk_cache_touch_lock:
+            _disk_cache_touched.pop(key, None)
+        print(f"Набор данных {key} удален из дискового кэша")
+
+register_dataset(sample_data.copy(), SAMPLE_DATASET_KEY)
+
+# Фоновый разбор загрузок: задачи выполняются в отдельных процессах DiskcacheManager,
+# состояние задач общее для всех воркеров через каталог FLEET_JOBS_DIR. Результат передается
+# воркеру через дисковый кэш наборов, поэтому без pyarrow файл разбирается прямо в запросе
+JOBS_DIR = os.environ.get('FLEET_JOBS_DIR',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fleet_jobs'))
+INGEST_CHUNK_ROWS = int(os.environ.get('FLEET_INGEST_CHUNK_ROWS', '200000'))
+# Интервал опроса состояния задачи. Входы callback'а (сам файл) отправляются только при запуске,
+# в опросах Dash передает их пустыми, так что опрос - небольшой запрос, читающий прогресс из
+# FLEET_JOBS_DIR. Интервал ограничивает задержку переключения на готовый набор и частоту
+# обновления прогресса: часть из INGEST_CHUNK_ROWS строк разбирается примерно за полсекунды
+INGEST_POLL_MS = int(os.environ.get('FLEET_INGEST_POLL_MS', '500'))
+
+# DiskcacheManager запускает задачу через fork, а воркер gunicorn многопоточный: fork копирует
+# блокировки, захваченные другими потоками (_dataset_cache_lock, _metrics_lock), и процесс
+# задачи может зависнуть на первой же из них. Задачи запускаются через forkserver
+# из отдельного однопоточного процесса, app в нем импортируется заново
+if diskcache is not None:
+    class ForkserverDiskcacheManager(DiskcacheManager):
+        def call_job_fn(self, key, job_fn, args, context):
+            process = multiprocess.get_context('forkserver').Process(
+                target=job_fn, args=(key, self._make_progress_key(key), args, context))
+            process.start()
+            return process.pid
+
+INGEST_MANAGER = None
+if diskcache is not None and pa is not None:
+    jobs_cache = diskcache.Cache(JOBS_DIR)
+    # Соединение SQLite откроется заново в каждом процессе и потоке при первом обращении
+    jobs_cache.close()
+    INGEST_MANAGER = ForkserverDiskcacheManager(jobs_cache, expire=3600)
+
 app.layout = html.Div([
+    # Адрес страницы: ?dataset=<ключ> открывает набор, загруженный через /upload
+    dcc.Location(id='url', refresh=False),
+    
     # Заголовок
     html.H1("🚗 Управление автопарком", 
             style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': '30px'}),
@@ -47,6 +893,25 @@ app.layout = html.Div([
             },
             multiple=False
         ),
+        # Ход фоновой загрузки: прочитанный объем файла и отмена
+        html.Div([
+            html.Progress(id='upload-progress', style={'width': '100%'}),
+            html.Div(id='upload-progress-text', style={'color': '#666', 'fontSize': '14px'}),
+            html.Button("Отменить загрузку", id='cancel-upload', n_clicks=0,
+                       style={'marginTop': '5px', 'padding': '5px 15px'} if INGEST_MANAGER is not None
+                       else {'display': 'none'})
+        ], id='upload-progress-container', style={'display': 'none'}),
+        dcc.RadioItems(
+            id='upload-mode',
+            options=[
+                {'label': 'Заменить данные', 'value': 'replace'},
+                {'label': 'Добавить к текущим (новый месяц)', 'value': 'append'}
+            ],
+            value='replace',
+            inline=True,
+            style={'textAlign': 'center'},
+            inputStyle={'marginLeft': '15px', 'marginRight': '5px'}
+        ),
         html.P("Или используйте пример данных:", style={'textAlign': 'center', 'marginTop': '10px'}),
         html.Button("Загрузить пример данных", id="load-sample", n_clicks=0,
                    style={'margin': '10px auto', 'display': 'block', 'padding': '10px 20px'})
@@ -65,6 +930,17 @@ app.layout = html.Div([
             ],
             value='month',
             style={'width': '200px', 'margin': '10px'}
+        ),
+        # Окно дат: ограничивает все графики, KPI и таблицу
+        html.Label("🗓️ Диапазон дат:", style={'fontWeight': 'bold'}),
+        dcc.DatePickerRange(
+            id='date-range',
+            display_format='DD.MM.YYYY',
+            first_day_of_week=1,
+            start_date_placeholder_text='Начало',
+            end_date_placeholder_text='Конец',
+            clearable=True,
+            style={'margin': '10px'}
         )
     ], style={'margin': '20px', 'textAlign': 'center'}),
     
@@ -109,6 +985,13 @@ app.layout = html.Div([
         dash_table.DataTable(
             id='vehicles-table',
             page_size=10,
+            page_current=0,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
             style_table={'overflowX': 'auto', 'borderRadius': '10px', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)'},
             style_cell={
                 'textAlign': 'left', 
@@ -148,67 +1031,215 @@ app.layout = html.Div([
     ], style={'margin': '20px', 'padding': '20px', 'background': '#f5f5f5', 'borderRadius': '10px'}),
 
     # Скрытое хранилище для данных
-    dcc.Store(id='stored-data')
+    dcc.Store(id='stored-data', data=SAMPLE_DATASET_KEY),
+    dcc.Store(id='trend-data')
 ], style={'fontFamily': 'Arial, sans-serif', 'padding': '20px', 'maxWidth': '1400px', 'margin': 'auto'})
 
+# Схема известных колонок автопарка: типы задаются при чтении, без повторного вывода
+FLEET_DTYPES = {
+    'vehicle_id': 'str',
+    'vehicle_type': 'category',
+    'mileage': 'float64',
+    'fuel_consumption': 'float64',
+    'fuel_cost': 'float64',
+    'maintenance_cost': 'float64',
+    'maintenance_status': 'category',
+    'status': 'category',
+    'vehicle_age': 'float64'
+}
+DATE_COLUMNS = ['date', 'last_service_date', 'next_service_date']
+CSV_ENCODINGS = ['utf-8', 'utf-8-sig', 'cp1251', 'latin1']
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Источник CSV: байты или двоичный файл с произвольным доступом (потоковая загрузка через /upload)
+def open_csv_source(source):
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+def csv_source_size(source):
+    if isinstance(source, bytes):
+        return len(source)
+    source.seek(0, os.SEEK_END)
+    return source.tell()
+
+# Определение кодировки по ограниченному фрагменту файла
+def detect_encoding(source):
+    data = source if isinstance(source, bytes) else open_csv_source(source).read(ENCODING_SAMPLE_BYTES + 1)
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    
+    sample = data[:ENCODING_SAMPLE_BYTES]
+    is_complete = len(sample) == len(data)
+    for encoding in ['utf-8', 'cp1251']:
+        try:
+            # Инкрементальный декодер не спотыкается о символ, обрезанный на границе фрагмента
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=is_complete)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    
+    return 'latin1'
+
+# Чтение частями по INGEST_CHUNK_ROWS строк с отчетом progress(прочитано байт, всего байт, строк).
+# Каждая часть сразу приводится к компактным типам, поэтому пик памяти определяется размером
+# набора, а не текстовым представлением файла
+def read_csv_chunks(source, encoding, dtypes, parse_dates, progress=None):
+    total = csv_source_size(source)
+    buffer = open_csv_source(source)
+    chunks = []
+    categories = {}
+    rows = 0
+    with pd.read_csv(buffer, encoding=encoding, dtype=dtypes, parse_dates=parse_dates,
+                     chunksize=INGEST_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            chunk = normalize_fleet_df(chunk)
+            # Части ссылаются на общий набор категорий: pandas кэширует хеш-таблицу у каждого
+            # набора, и для vehicle_id отдельный набор в каждой части рос бы вместе с файлом
+            for col in chunk.columns:
+                if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                    current = chunk[col].cat.categories
+                    known = categories.get(col)
+                    if known is None or not current.isin(known).all():
+                        known = categories[col] = current if known is None else known.union(current)
+                    if current is not known:
+                        chunk[col] = chunk[col].cat.set_categories(known)
+            chunks.append(chunk)
+            rows += len(chunk)
+            if progress is not None:
+                progress(min(buffer.tell(), total), total, rows)
+    
+    if not chunks:
+        return pd.read_csv(open_csv_source(source), encoding=encoding, dtype=dtypes, parse_dates=parse_dates)
+    
+    # Склеиваем по колонкам, сразу освобождая колонку в частях: в памяти одновременно
+    # набор и одна колонка, а не две полные копии
+    columns = {}
+    for col in list(chunks[0].columns):
+        parts = [chunk.pop(col) for chunk in chunks]
+        # Ранние части могли получить набор категорий до появления новых значений,
+        # а concat превратил бы колонку с разными наборами в текстовую
+        if col in categories and all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            known = categories[col]
+            parts = [part if part.cat.categories is known else part.cat.set_categories(known) for part in parts]
+        columns[col] = pd.concat(parts, ignore_index=True)
+        del parts
+    return pd.DataFrame(columns, copy=False)
+
+# Чтение CSV за один проход: схема типов и разбор дат выполняются читателем
+def read_fleet_csv(source, encoding, progress=None):
+    # Заголовок читаем из полного источника: фрагмент может обрезать многобайтовый символ
+    header = pd.read_csv(open_csv_source(source), encoding=encoding, nrows=0).columns
+    dtypes = {col: dtype for col, dtype in FLEET_DTYPES.items() if col in header}
+    parse_dates = [col for col in DATE_COLUMNS if col in header]
+    
+    # Файлы потоковой загрузки и фоновые задачи читаются частями
+    def read(dtypes):
+        if progress is None and isinstance(source, bytes):
+            return pd.read_csv(open_csv_source(source), encoding=encoding, dtype=dtypes, parse_dates=parse_dates)
+        return read_csv_chunks(source, encoding, dtypes, parse_dates, progress)
+    
+    try:
+        df = read(dtypes)
+    except UnicodeDecodeError:
+        # Ошибка кодировки - тоже ValueError, но повтор без схемы ее не исправит
+        raise
+    except ValueError as e:
+        # Нечисловые значения в числовых колонках: читаем без схемы для чисел и приводим с coerce
+        print(f"Схема типов не подошла ({e}), числовые колонки будут приведены принудительно")
+        text_dtypes = {col: dtype for col, dtype in dtypes.items() if dtype != 'float64'}
+        df = read(text_dtypes)
+        for col, dtype in dtypes.items():
+            if dtype == 'float64':
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    # Читатель оставляет колонку текстовой, если часть дат не разобралась
+    for col in parse_dates:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            try:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+            except Exception as e:
+                print(f"Ошибка при преобразовании даты в колонке {col}: {e}")
+    
+    return df
+
+# Содержимое dcc.Upload (data URL с base64) в байты файла, None при ошибке
+def decode_upload_contents(contents):
+    try:
+        content_type, content_string = contents.split(',')
+        return base64.b64decode(content_string)
+    except Exception as e:
+        print(f"Критическая ошибка при декодировании файла: {e}")
+        return None
+
 # Функция для парсинга CSV
 def parse_contents(contents, filename):
     if contents is None:
         return None
     
+    decoded = decode_upload_contents(contents)
+    if decoded is None:
+        return None
+    
+    return parse_csv_source(decoded, filename)
+
+@timed('ingest')
+def parse_csv_source(source, filename, progress=None):
     try:
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        
         if 'csv' in filename.lower():
-            # Пробуем разные кодировки
-            encodings = ['utf-8', 'utf-8-sig', 'cp1251', 'latin1']
+            started = time.perf_counter()
+            encoding = detect_encoding(source)
             df = None
             
-            for encoding in encodings:
+            # Если кодировка по фрагменту определилась неверно, пробуем следующие.
+            # utf-8-sig отличается от utf-8 только BOM, а его detect_encoding уже проверил
+            candidates = [candidate for candidate in CSV_ENCODINGS[CSV_ENCODINGS.index(encoding):]
+                          if candidate != 'utf-8-sig' or encoding == 'utf-8-sig']
+            for candidate in candidates:
                 try:
-                    df = pd.read_csv(io.StringIO(decoded.decode(encoding)))
-                    print(f"Файл успешно прочитан с кодировкой {encoding}")
+                    df = read_fleet_csv(source, candidate, progress)
+                    print(f"Файл успешно прочитан с кодировкой {candidate}")
                     break
                 except UnicodeDecodeError:
                     continue
                 except Exception as e:
-                    print(f"Ошибка при чтении с кодировкой {encoding}: {e}")
+                    print(f"Ошибка при чтении с кодировкой {candidate}: {e}")
                     continue
             
             if df is None:
-                # Пробуем прочитать без указания кодировки
-                try:
-                    df = pd.read_csv(io.BytesIO(decoded))
-                except Exception as e:
-                    print(f"Ошибка при чтении файла: {e}")
-                    return None
+                return None
             
             # Проверяем, что DataFrame не пустой
             if df.empty:
                 print("DataFrame пустой после чтения")
                 return None
             
-            # Преобразование даты
-            date_columns = ['date', 'last_service_date', 'next_service_date']
-            for col in date_columns:
-                if col in df.columns:
-                    try:
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
-                    except Exception as e:
-                        print(f"Ошибка при преобразовании даты в колонке {col}: {e}")
+            # Удаляем строки с некорректными датами (без копии набора, если таких нет)
+            if 'date' in df.columns and df['date'].isna().any():
+                df = df.dropna(subset=['date'])
+                if df.empty:
+                    print("Нет строк с корректной датой")
+                    return None
             
             # Заполнение пропущенных значений
             numeric_cols = df.select_dtypes(include=[np.number]).columns
             for col in numeric_cols:
-                df[col] = df[col].fillna(df[col].mean() if not df[col].isnull().all() else 0)
+                if df[col].isnull().any():
+                    df[col] = df[col].fillna(df[col].mean() if not df[col].isnull().all() else 0)
             
-            # Заполнение текстовых колонок
-            text_cols = df.select_dtypes(include=['object']).columns
+            # Заполнение текстовых и категориальных колонок
+            text_cols = df.select_dtypes(include=['object', 'string', 'category']).columns
             for col in text_cols:
-                df[col] = df[col].fillna('Не указано')
+                if df[col].isnull().any():
+                    if isinstance(df[col].dtype, pd.CategoricalDtype):
+                        if 'Не указано' not in df[col].cat.categories:
+                            df[col] = df[col].cat.add_categories('Не указано')
+                    df[col] = df[col].fillna('Не указано')
             
-            print(f"Успешно загружено {len(df)} строк, {len(df.columns)} колонок")
+            elapsed = time.perf_counter() - started
+            print(f"Успешно загружено {len(df)} строк, {len(df.columns)} колонок "
+                  f"за {elapsed:.2f} с ({csv_source_size(source) / 1024 / 1024:.1f} МБ)")
             print(f"Колонки: {list(df.columns)}")
             
             return df
@@ -220,293 +1251,1365 @@ def parse_contents(contents, filename):
     
     return None
 
-# Callback для загрузки данных
-@app.callback(
+# Загрузка файла: повторная загрузка того же содержимого берется из кэша по хешу
+def ingest_upload(contents, filename, progress=None):
+    decoded = decode_upload_contents(contents)
+    if decoded is None:
+        return None
+    
+    key = content_key(decoded)
+    if get_dataset(key) is not None:
+        print(f"Файл {filename} уже загружался, используется кэш ({key})")
+        return key
+    
+    df = parse_csv_source(decoded, filename, progress)
+    if df is None or df.empty:
+        return None
+    
+    return register_dataset(df, key, persist=True)
+
+# Дозагрузка файла к текущему набору: ключ результата зависит от обоих источников
+def append_upload(base_key, contents, filename, progress=None):
+    decoded = decode_upload_contents(contents)
+    if decoded is None:
+        return None
+    
+    key = content_key(f"{base_key}+{content_key(decoded)}".encode())
+    if get_dataset(key) is not None:
+        print(f"Файл {filename} уже добавлялся к этому набору, используется кэш ({key})")
+        return key
+    
+    base = get_dataset(base_key)
+    if base is None:
+        return None
+    
+    new_df = parse_csv_source(decoded, filename, progress)
+    if new_df is None or new_df.empty:
+        return None
+    
+    store_dataset(append_to_dataset(base, new_df, key), persist=True)
+    return key
+
+# Потоковая загрузка CSV без base64 и dcc.Upload: тело запроса (сырой CSV или multipart
+# с полем file) частями пишется во временный файл с одновременным хешированием, затем
+# читается с диска, поэтому в памяти не бывает полной копии файла ни в каком виде.
+#
+#   curl --data-binary @fleet.csv -H 'Content-Type: text/csv' 'http://host/upload?filename=fleet.csv'
+#   curl -F file=@fleet.csv http://host/upload
+#
+# Ответ содержит ключ набора и адрес дашборда с этим набором
+UPLOAD_MAX_BYTES = int(os.environ.get('FLEET_UPLOAD_MAX_MB', '1024')) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+@server.route('/upload', methods=['POST'])
+def upload_dataset():
+    request = flask.request
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': "Ожидается поле file с CSV файлом"}), 400
+        stream, filename = upload.stream, upload.filename or 'upload.csv'
+    else:
+        stream, filename = request.stream, request.args.get('filename', 'upload.csv')
+    
+    with tempfile.TemporaryFile() as spool:
+        digest = content_hasher()
+        size = 0
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                return jsonify({'error': f"Файл больше {format_bytes(UPLOAD_MAX_BYTES)}"}), 413
+            digest.update(chunk)
+            spool.write(chunk)
+        
+        if size == 0:
+            return jsonify({'error': "Пустой файл"}), 400
+        
+        key = digest.hexdigest()
+        entry = get_dataset(key)
+        if entry is None:
+            df = parse_csv_source(spool, filename)
+            if df is None or df.empty:
+                return jsonify({'error': "Не удалось загрузить файл. Проверьте формат CSV файла."}), 400
+            register_dataset(df, key, persist=True)
+            entry = get_dataset(key)
+        else:
+            print(f"Файл {filename} уже загружался, используется кэш ({key})")
+    
+    return jsonify({'key': key, 'rows': entry['totals']['rows'], 'url': f"{request.script_root}/?dataset={key}"})
+
+# Callback для загрузки данных. С менеджером фоновых задач файл разбирается вне запроса:
+# браузер опрашивает ход задачи, а stored-data меняется только после завершения разбора
+UPLOAD_CALLBACK_ARGS = (
     [Output('stored-data', 'data'),
      Output('error-message', 'children'),
      Output('error-message', 'style')],
-    [Input('upload-data', 'contents'),
-     Input('load-sample', 'n_clicks')],
-    [State('upload-data', 'filename')]
+    [Input('upload-data', 'contents')],
+    [State('upload-data', 'filename'),
+     State('upload-mode', 'value'),
+     State('stored-data', 'data')]
 )
-def update_stored_data(contents, n_clicks, filename):
-    ctx = dash.callback_context
-    
-    if not ctx.triggered:
-        return sample_data.to_dict('records'), "", {'display': 'none'}
-    
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    if trigger_id == 'upload-data' and contents is not None:
-        df = parse_contents(contents, filename)
-        if df is not None and not df.empty:
-            return df.to_dict('records'), "", {'display': 'none'}
+ERROR_MESSAGE_STYLE = {'display': 'block', 'color': '#d32f2f', 'padding': '10px', 'background': '#ffebee', 'borderRadius': '5px'}
+UPLOAD_RUNNING = [
+    (Output('upload-progress-container', 'style'), {'display': 'block', 'margin': '10px'}, {'display': 'none'}),
+    (Output('upload-data', 'disabled'), True, False),
+    (Output('load-sample', 'disabled'), True, False)
+]
+
+# Отчет о ходе разбора для индикатора: (значение, максимум, подпись)
+def upload_progress_reporter(set_progress):
+    def report(done, total, rows):
+        if done >= total:
+            text = f"Файл прочитан ({rows:,} строк), построение агрегатов..."
         else:
-            error_msg = "Не удалось загрузить файл. Проверьте формат CSV файла."
-            return dash.no_update, error_msg, {'display': 'block', 'color': '#d32f2f', 'padding': '10px', 'background': '#ffebee', 'borderRadius': '5px'}
+            text = f"Прочитано {format_bytes(done)} из {format_bytes(total)} ({rows:,} строк)"
+        set_progress((done, total, text))
+    return report
+
+@profiled
+def update_stored_data(set_progress, contents, filename, upload_mode, stored_data):
+    if contents is None:
+        return dash.no_update, dash.no_update, dash.no_update
     
-    elif trigger_id == 'load-sample':
-        return sample_data.to_dict('records'), "", {'display': 'none'}
+    progress = upload_progress_reporter(set_progress) if set_progress is not None else None
+    if upload_mode == 'append' and stored_data:
+        if get_dataset(stored_data) is None:
+            return dash.no_update, DATASET_EXPIRED_MESSAGE, ERROR_MESSAGE_STYLE
+        key = append_upload(stored_data, contents, filename, progress)
+    else:
+        key = ingest_upload(contents, filename, progress)
     
-    return sample_data.to_dict('records'), "", {'display': 'none'}
+    if key is not None:
+        return key, "", {'display': 'none'}
+    else:
+        error_msg = "Не удалось загрузить файл. Проверьте формат CSV файла."
+        return dash.no_update, error_msg, ERROR_MESSAGE_STYLE
+
+if INGEST_MANAGER is not None:
+    app.callback(
+        *UPLOAD_CALLBACK_ARGS,
+        background=True,
+        manager=INGEST_MANAGER,
+        interval=INGEST_POLL_MS,
+        progress=[Output('upload-progress', 'value'),
+                  Output('upload-progress', 'max'),
+                  Output('upload-progress-text', 'children')],
+        progress_default=[None, None, "Подготовка файла..."],
+        cancel=[Input('cancel-upload', 'n_clicks')],
+        running=UPLOAD_RUNNING,
+        prevent_initial_call=True
+    )(update_stored_data)
+else:
+    # Без менеджера фоновых задач файл разбирается в запросе, индикатор без прогресса
+    @app.callback(*UPLOAD_CALLBACK_ARGS, running=UPLOAD_RUNNING, prevent_initial_call=True)
+    def update_stored_data_sync(*args):
+        return update_stored_data(None, *args)
 
-# Основной callback для обновления дашборда
+# Пример данных всегда в памяти, поэтому выбирается в запросе, без фоновой задачи
 @app.callback(
-    [Output('mileage-trend', 'figure'),
-     Output('vehicle-type-distribution', 'figure'),
-     Output('fuel-consumption', 'figure'),
-     Output('maintenance-status', 'figure'),
-     Output('cost-breakdown', 'figure'),
-     Output('age-vs-mileage', 'figure'),
-     Output('vehicles-table', 'data'),
-     Output('vehicles-table', 'columns'),
-     Output('total-vehicles', 'children'),
-     Output('avg-mileage', 'children'),
-     Output('utilization-rate', 'children'),
-     Output('total-costs', 'children'),
-     Output('data-info', 'children')],
-    [Input('stored-data', 'data'),
-     Input('period-selector', 'value')]
+    [Output('stored-data', 'data', allow_duplicate=True),
+     Output('error-message', 'children', allow_duplicate=True),
+     Output('error-message', 'style', allow_duplicate=True)],
+    [Input('load-sample', 'n_clicks')],
+    prevent_initial_call=True
 )
-def update_dashboard(stored_data, period):
-    try:
-        if stored_data is None or len(stored_data) == 0:
-            # Возвращаем пустые графики если нет данных
-            empty_fig = go.Figure()
-            empty_fig.update_layout(
-                title="Нет данных для отображения",
-                xaxis_title="",
-                yaxis_title="",
-                annotations=[dict(
-                    text="Загрузите данные для отображения",
-                    xref="paper", yref="paper",
-                    x=0.5, y=0.5, showarrow=False
-                )]
-            )
-            return [empty_fig] * 6 + [[], [], "0", "0 км", "0%", "0 ₽", "Нет данных"]
-        
-        # Преобразуем данные обратно в DataFrame
-        df = pd.DataFrame(stored_data)
-        
-        # Информация о данных
-        vehicle_count = df['vehicle_id'].nunique() if 'vehicle_id' in df.columns else len(df)
-        data_info = f"Загружено {len(df)} записей, {vehicle_count} уникальных ТС"
+def load_sample_data(n_clicks):
+    return SAMPLE_DATASET_KEY, "", {'display': 'none'}
+
+# Набор из адреса страницы (?dataset=<ключ>), например после загрузки через /upload
+@app.callback(
+    [Output('stored-data', 'data', allow_duplicate=True),
+     Output('error-message', 'children', allow_duplicate=True),
+     Output('error-message', 'style', allow_duplicate=True)],
+    [Input('url', 'search')],
+    prevent_initial_call='initial_duplicate'
+)
+def load_dataset_from_url(search):
+    key = parse_qs((search or '').lstrip('?')).get('dataset', [None])[0]
+    if not key:
+        return dash.no_update, dash.no_update, dash.no_update
+    if get_dataset(key) is None:
+        return dash.no_update, DATASET_EXPIRED_MESSAGE, ERROR_MESSAGE_STYLE
+    return key, "", {'display': 'none'}
+
+# Пустой график с подписью по центру
+def message_figure(title, text):
+    fig = go.Figure()
+    fig.update_layout(
+        title=title,
+        xaxis_title="",
+        yaxis_title="",
+        annotations=[dict(
+            text=text,
+            xref="paper", yref="paper",
+            x=0.5, y=0.5, showarrow=False
+        )]
+    )
+    return fig
+
+# Набор данных по ключу из stored-data, ограниченный окном дат:
+# (entry, None) или (None, график-заглушка)
+def resolve_dataset(stored_data, start_date=None, end_date=None):
+    if not stored_data:
+        return None, message_figure("Нет данных для отображения", "Загрузите данные для отображения")
+    
+    entry = get_dataset(stored_data)
+    if entry is None:
+        return None, message_figure("Набор данных устарел", "Загрузите файл повторно")
+    
+    prewarm_figures(entry, start_date, end_date)
+    return dataset_window(entry, start_date, end_date), None
+
+# Бюджет точек для динамики пробега: длинные ряды прореживаются LTTB с сохранением формы
+TREND_MAX_POINTS = int(os.environ.get('FLEET_TREND_MAX_POINTS', '400'))
+TREND_MAX_TICKS = 12
+
+# Largest-Triangle-Three-Buckets: индексы точек, сохраняющих форму ряда
+def lttb_indices(y, threshold):
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.arange(n, dtype=np.float64)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    
+    # Границы корзин для внутренних точек, первая и последняя точки сохраняются всегда
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.intp)
+    edges = np.append(edges, n)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = end, max(edges[i + 2], end + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
         
-        # Создание периодов для агрегации
-        if 'date' in df.columns:
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    
+    return selected
+
+# Диапазон оси X из relayoutData графика, None если масштаб не задан
+def relayout_x_range(relayout_data):
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    if isinstance(relayout_data.get('xaxis.range'), list):
+        return relayout_data['xaxis.range']
+    return None
+
+TREND_TITLE = '📈 Динамика среднего пробега'
+
+# Ряд динамики пробега для периода. Если точек больше бюджета, ось X строится по номерам
+# периодов и ряд прореживается, а при приближении (x_range) участок отдается в полном разрешении
+def trend_series(entry, period, x_range=None):
+    period_col, mileage_agg = period_mileage(entry, period)
+    if mileage_agg.empty:
+        return None
+    
+    if len(mileage_agg) <= TREND_MAX_POINTS:
+        return {
+            'period_col': period_col,
+            'x': mileage_agg[period_col].tolist(),
+            'y': np.round(mileage_agg['mileage'].to_numpy(dtype=np.float64), 1).tolist()
+        }
+    
+    labels = mileage_agg[period_col].astype(str).to_numpy()
+    mileage = mileage_agg['mileage'].to_numpy(dtype=np.float64)
+    
+    lo, hi = 0, len(mileage) - 1
+    if x_range is not None:
+        # Захватываем по точке за краями окна, чтобы линия доходила до границ
+        lo = max(0, int(np.floor(float(x_range[0]))) - 1)
+        hi = min(len(mileage) - 1, int(np.ceil(float(x_range[1]))) + 1)
+        if hi <= lo:
+            lo, hi = 0, len(mileage) - 1
+    
+    positions = lo + lttb_indices(mileage[lo:hi + 1], TREND_MAX_POINTS)
+    full_resolution = len(positions) == hi - lo + 1
+    ticks = positions[np.linspace(0, len(positions) - 1, min(TREND_MAX_TICKS, len(positions))).astype(np.intp)]
+    
+    return {
+        'period_col': period_col,
+        'x': positions.tolist(),
+        'y': np.round(mileage[positions], 1).tolist(),
+        'labels': labels[positions].tolist(),
+        'tickvals': ticks.tolist(),
+        'ticktext': labels[ticks].tolist(),
+        'full': full_resolution,
+        'note': "" if full_resolution else f" (прорежено до {len(positions)} из {hi - lo + 1} точек, приблизьте для деталей)"
+    }
+
+# 1. График динамики пробега (по предрасчитанным агрегатам периода)
+@timed('figure:mileage-trend')
+def build_trend_figure(entry, period, x_range=None):
+    trend_fig = go.Figure()
+    if 'mileage' in entry['df'].columns:
+        try:
+            series = trend_series(entry, period, x_range)
+            if series is None:
+                return trend_fig
+            
+            period_col = series['period_col']
+            if 'labels' not in series:
+                trend_fig = px.line(
+                    pd.DataFrame({period_col: series['x'], 'mileage': series['y']}),
+                    x=period_col, 
+                    y='mileage',
+                    title=TREND_TITLE,
+                    labels={'mileage': 'Средний пробег (км)', period_col: 'Период'},
+                    markers=True
+                )
+                trend_fig.update_traces(line_color='#1e88e5', line_width=3)
+                trend_fig.update_layout(hovermode='x unified')
+                return trend_fig
+            
+            trend_fig = go.Figure(go.Scatter(
+                x=series['x'],
+                y=series['y'],
+                customdata=series['labels'],
+                mode='lines+markers' if series['full'] else 'lines',
+                line=dict(color='#1e88e5', width=3),
+                hovertemplate='%{customdata}<br>Средний пробег: %{y:,.0f} км<extra></extra>'
+            ))
+            trend_fig.update_layout(
+                title=TREND_TITLE + series['note'],
+                xaxis=dict(title='Период', tickmode='array', tickvals=series['tickvals'], ticktext=series['ticktext']),
+                yaxis_title='Средний пробег (км)',
+                hovermode='closest',
+                # Сохраняем масштаб пользователя при перерисовке того же ряда
+                uirevision=f"{entry['key']}:{period}"
+            )
+            if x_range is not None:
+                trend_fig.update_xaxes(range=x_range)
+        except Exception as e:
+            print(f"Ошибка при создании графика пробега: {e}")
+    return trend_fig
+
+# Компактные ряды динамики для всех периодов сразу: переключение периода
+# выполняется в браузере clientside callback'ом без запроса к серверу
+@timed('trend-data')
+def build_trend_data(entry):
+    layout = go.Figure(layout=dict(
+        template=plotly.io.templates[plotly.io.templates.default],
+        xaxis_title='Период',
+        yaxis_title='Средний пробег (км)'
+    )).to_plotly_json()['layout']
+    if FIGURE_COMPACT:
+        layout = trim_template(layout, {'scatter'})
+    
+    series = {}
+    if 'mileage' in entry['df'].columns:
+        for period in PERIODS:
             try:
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                df = df.dropna(subset=['date'])  # Удаляем строки с некорректными датами
-                
-                # Создаем периоды агрегации
-                df['year'] = df['date'].dt.year.astype(str)
-                df['month'] = df['date'].dt.strftime('%Y-%m')
-                df['quarter'] = df['date'].dt.to_period('Q').astype(str)
-                df['week'] = df['date'].dt.isocalendar().week.astype(str) + '-' + df['date'].dt.year.astype(str)
+                series[period] = trend_series(entry, period)
             except Exception as e:
-                print(f"Ошибка при обработке дат: {e}")
-        
-        # Устанавливаем период по умолчанию если колонка даты отсутствует
-        if period == 'year' and 'year' in df.columns:
-            period_col = 'year'
-        elif period == 'month' and 'month' in df.columns:
-            period_col = 'month'
-        elif period == 'quarter' and 'quarter' in df.columns:
-            period_col = 'quarter'
-        elif period == 'week' and 'week' in df.columns:
-            period_col = 'week'
+                print(f"Ошибка при подготовке ряда пробега для периода {period}: {e}")
+    
+    return {'key': entry['key'], 'title': TREND_TITLE, 'layout': layout, 'series': series}
+
+# Количество строк по значениям колонки в порядке убывания, как value_counts
+def group_counts(entry, col):
+    counts = entry['periods'][col]['rows']
+    return counts[counts > 0].astype(np.int64).sort_values(ascending=False, kind='stable').reset_index()
+
+# 2. Распределение по типам ТС
+@timed('figure:vehicle-type-distribution')
+def build_type_distribution_figure(entry):
+    pie_fig = go.Figure()
+    if 'vehicle_type' in entry['periods']:
+        try:
+            type_counts = group_counts(entry, 'vehicle_type')
+            type_counts.columns = ['vehicle_type', 'count']
+            if not type_counts.empty:
+                pie_fig = px.pie(
+                    type_counts,
+                    values='count',
+                    names='vehicle_type',
+                    title='🚘 Распределение по типам ТС',
+                    hole=0.3,
+                    color_discrete_sequence=px.colors.qualitative.Set3
+                )
+                pie_fig.update_traces(textposition='inside', textinfo='percent+label')
+        except Exception as e:
+            print(f"Ошибка при создании круговой диаграммы: {e}")
+    return pie_fig
+
+# 3. Расход топлива по типам ТС
+@timed('figure:fuel-consumption')
+def build_fuel_figure(entry):
+    fuel_fig = go.Figure()
+    types = entry['periods'].get('vehicle_type')
+    if types is not None and 'fuel_consumption_sum' in types.columns:
+        try:
+            counts = types['fuel_consumption_count']
+            fuel_agg = (types['fuel_consumption_sum'][counts > 0] / counts[counts > 0]).rename('fuel_consumption').reset_index()
+            if not fuel_agg.empty:
+                fuel_fig = px.bar(
+                    fuel_agg.sort_values('fuel_consumption', ascending=False),
+                    x='vehicle_type',
+                    y='fuel_consumption',
+                    title='⛽ Средний расход топлива по типам ТС',
+                    labels={'fuel_consumption': 'Расход (л/100км)', 'vehicle_type': 'Тип ТС'},
+                    color='fuel_consumption',
+                    color_continuous_scale='RdYlGn_r'
+                )
+                fuel_fig.update_layout(xaxis_tickangle=-45)
+        except Exception as e:
+            print(f"Ошибка при создании графика расхода топлива: {e}")
+    return fuel_fig
+
+# 4. Статус технического обслуживания
+@timed('figure:maintenance-status')
+def build_maintenance_figure(entry):
+    status_fig = go.Figure()
+    if 'maintenance_status' in entry['periods']:
+        try:
+            status_counts = group_counts(entry, 'maintenance_status')
+            status_counts.columns = ['status', 'count']
+            if not status_counts.empty:
+                colors = {'Исправен': '#4caf50', 'Требуется ТО': '#ff9800', 'На ремонте': '#f44336'}
+                status_fig = px.bar(
+                    status_counts,
+                    x='status',
+                    y='count',
+                    title='🔧 Статус технического обслуживания',
+                    labels={'count': 'Количество ТС', 'status': 'Статус'},
+                    color='status',
+                    color_discrete_map=colors
+                )
+                status_fig.update_layout(showlegend=False)
+        except Exception as e:
+            print(f"Ошибка при создании графика статусов: {e}")
+    return status_fig
+
+# 5. Структура затрат
+@timed('figure:cost-breakdown')
+def build_cost_figure(entry):
+    totals = entry['totals']
+    cost_fig = go.Figure()
+    cost_columns = ['fuel_cost', 'maintenance_cost']
+    available_cost_cols = [col for col in cost_columns if f'{col}_sum' in totals]
+    
+    if available_cost_cols:
+        try:
+            costs = {}
+            for col in available_cost_cols:
+                cost_name = 'Топливо' if 'fuel' in col else 'Ремонт'
+                costs[cost_name] = totals[f'{col}_sum']
+            
+            if costs:
+                cost_df = pd.DataFrame(list(costs.items()), columns=['category', 'amount'])
+                cost_fig = px.pie(
+                    cost_df,
+                    values='amount',
+                    names='category',
+                    title='💰 Структура затрат',
+                    hole=0.4,
+                    color_discrete_sequence=['#FF6B6B', '#4ECDC4']
+                )
+                cost_fig.update_traces(textposition='inside', textinfo='percent+label')
+        except Exception as e:
+            print(f"Ошибка при создании графика затрат: {e}")
+    return cost_fig
+
+# Уровень детализации scatter: до порога отдельные точки в WebGL, выше - плотность по 2D-гистограмме
+SCATTER_WEBGL_MAX_POINTS = int(os.environ.get('FLEET_SCATTER_MAX_POINTS', '20000'))
+SCATTER_DENSITY_BINS = 60
+
+# Линии тренда в замкнутой форме (МНК по группам через суммы), кэшируются в записи набора
+def scatter_trendlines(entry):
+    trendlines = entry.get('trendlines')
+    if trendlines is not None:
+        return trendlines
+    
+    df = entry['df']
+    x = df['vehicle_age'].to_numpy(dtype=np.float64, na_value=np.nan)
+    y = df['mileage'].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    
+    if 'vehicle_type' in df.columns:
+        codes, groups = pd.factorize(df['vehicle_type'], use_na_sentinel=False)
+        groups = [str(group) for group in groups]
+    else:
+        codes, groups = np.zeros(len(df), dtype=np.intp), [None]
+    
+    codes, x, y = codes[valid], x[valid], y[valid]
+    size = len(groups)
+    n = np.bincount(codes, minlength=size).astype(np.float64)
+    sum_x = np.bincount(codes, weights=x, minlength=size)
+    sum_y = np.bincount(codes, weights=y, minlength=size)
+    sum_xx = np.bincount(codes, weights=x * x, minlength=size)
+    sum_xy = np.bincount(codes, weights=x * y, minlength=size)
+    
+    x_min = np.full(size, np.inf)
+    x_max = np.full(size, -np.inf)
+    np.minimum.at(x_min, codes, x)
+    np.maximum.at(x_max, codes, x)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = n * sum_xx - sum_x ** 2
+        slope = np.where(denominator != 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = np.where(n > 0, (sum_y - slope * sum_x) / n, np.nan)
+    
+    trendlines = pd.DataFrame({
+        'group': groups, 'n': n, 'slope': slope, 'intercept': intercept, 'x_min': x_min, 'x_max': x_max
+    })
+    trendlines = trendlines[trendlines['n'] > 1]
+    entry['trendlines'] = trendlines
+    return trendlines
+
+def add_trendline_traces(fig, trendlines, colors):
+    for i, row in enumerate(trendlines.itertuples()):
+        x_values = [row.x_min, row.x_max]
+        fig.add_trace(go.Scattergl(
+            x=x_values,
+            y=[row.intercept + row.slope * x for x in x_values],
+            mode='lines',
+            name=f"Тренд: {row.group}" if row.group is not None else "Тренд",
+            line=dict(color=colors.get(row.group, '#455a64'), width=2),
+            hovertemplate=f"y = {row.slope:,.0f}·x + {row.intercept:,.0f}<extra></extra>",
+            showlegend=False
+        ))
+
+# 6. Зависимость пробега от возраста
+@timed('figure:age-vs-mileage')
+def build_scatter_figure(entry):
+    df = entry['df']
+    scatter_fig = go.Figure()
+    if all(col in df.columns for col in ['vehicle_age', 'mileage']):
+        try:
+            title = '📊 Зависимость пробега от возраста ТС'
+            labels = {'vehicle_age': 'Возраст (лет)', 'mileage': 'Пробег (км)'}
+            trendlines = scatter_trendlines(entry)
+            
+            if len(df) <= SCATTER_WEBGL_MAX_POINTS:
+                scatter_fig = px.scatter(
+                    df,
+                    x='vehicle_age',
+                    y='mileage',
+                    color='vehicle_type' if 'vehicle_type' in df.columns else None,
+                    size='fuel_consumption' if 'fuel_consumption' in df.columns else None,
+                    title=title,
+                    labels=labels,
+                    hover_data=['vehicle_id'] if 'vehicle_id' in df.columns else None,
+                    render_mode='webgl'
+                )
+                scatter_fig.update_traces(marker=dict(opacity=0.7, line=dict(width=1, color='DarkSlateGrey')))
+                colors = {trace.name: trace.marker.color for trace in scatter_fig.data}
+                colors[None] = colors.get('', '#1e88e5')
+            else:
+                # Много точек: агрегируем в 2D-гистограмму, размер ответа не зависит от числа строк
+                x = df['vehicle_age'].to_numpy(dtype=np.float64, na_value=np.nan)
+                y = df['mileage'].to_numpy(dtype=np.float64, na_value=np.nan)
+                valid = ~(np.isnan(x) | np.isnan(y))
+                x, y = x[valid], y[valid]
+                
+                # Возраст обычно целый: по одной корзине на год, если значений немного
+                ages = np.unique(x)
+                if len(ages) <= SCATTER_DENSITY_BINS and np.all(ages == np.round(ages)):
+                    x_bins = np.arange(ages[0] - 0.5, ages[-1] + 1.5)
+                else:
+                    x_bins = SCATTER_DENSITY_BINS
+                counts, x_edges, y_edges = np.histogram2d(x, y, bins=[x_bins, SCATTER_DENSITY_BINS])
+                
+                scatter_fig = go.Figure(go.Heatmap(
+                    x=(x_edges[:-1] + x_edges[1:]) / 2,
+                    y=(y_edges[:-1] + y_edges[1:]) / 2,
+                    z=np.where(counts.T > 0, counts.T, np.nan),
+                    colorscale='Blues',
+                    colorbar=dict(title='ТС'),
+                    hovertemplate='Возраст: %{x:.0f}<br>Пробег: %{y:,.0f}<br>Записей: %{z}<extra></extra>'
+                ))
+                scatter_fig.update_layout(
+                    title=f"{title} (плотность, {int(valid.sum()):,} записей)",
+                    xaxis_title=labels['vehicle_age'],
+                    yaxis_title=labels['mileage']
+                )
+                palette = px.colors.qualitative.Plotly
+                colors = {group: palette[i % len(palette)] for i, group in enumerate(trendlines['group'])}
+            
+            add_trendline_traces(scatter_fig, trendlines, colors)
+        except Exception as e:
+            print(f"Ошибка при создании scatter графика: {e}")
+    return scatter_fig
+
+# Форматирование колонок для таблицы
+def build_table_columns(entry):
+    df = entry['df']
+    table_columns = []
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            column_def = {
+                'name': col,
+                'id': col,
+                'type': 'numeric',
+                'format': {'specifier': ',.0f'} if 'cost' in col.lower() or 'mileage' in col.lower() else {'specifier': ',.1f'}
+            }
         else:
-            # Если нет даты, используем vehicle_id как группировку
-            period_col = 'vehicle_id' if 'vehicle_id' in df.columns else 'index'
-            if period_col == 'index':
-                df['index'] = range(len(df))
+            column_def = {'name': col, 'id': col}
+        table_columns.append(column_def)
+    return table_columns
+
+# Расчет показателей KPI и информации о данных (по предрасчитанным итогам)
+@timed('kpis')
+def build_kpis(entry):
+    totals = entry['totals']
+    
+    # Информация о данных
+    vehicle_count = totals.get('vehicles', totals['rows'])
+    data_info = (f"Загружено {totals['rows']} записей, {vehicle_count} уникальных ТС, "
+                 f"{format_bytes(entry['nbytes'])} в памяти")
+    window = entry.get('window')
+    if window is not None:
+        period = f"за {window['label']}" if window['label'] else "(нет записей в выбранном диапазоне)"
+        data_info = (f"Показано {totals['rows']} из {window['rows']} записей {period}, "
+                     f"{vehicle_count} уникальных ТС, {format_bytes(entry['nbytes'])} в памяти")
+    
+    total_vehicles = str(vehicle_count)
+    
+    avg_mileage = "Н/Д"
+    if totals.get('mileage_count'):
+        avg_mileage = f"{totals['mileage_sum'] / totals['mileage_count']:,.0f} км"
+    
+    # Коэффициент использования
+    utilization_rate = "Н/Д"
+    if 'working' in totals:
+        utilization = (totals['working'] / totals['rows'] * 100) if totals['rows'] > 0 else 0
+        utilization_rate = f"{utilization:.1f}%"
+    
+    # Общие затраты
+    total_costs = totals.get('fuel_cost_sum', 0) + totals.get('maintenance_cost_sum', 0)
+    total_costs_display = f"{total_costs:,.0f} ₽" if total_costs > 0 else "Н/Д"
+    
+    return [total_vehicles, avg_mileage, utilization_rate, total_costs_display, data_info]
+
+def error_figure():
+    return message_figure("Ошибка при обработке данных", "Произошла ошибка при обработке данных")
+
+# Мемоизация результатов callback'ов по (ключ набора, период, id графика).
+# Ключ набора - хеш содержимого, поэтому один и тот же файл у разных диспетчеров
+# и возврат к прежнему периоду отдают готовый результат. В памяти хранится уже разобранный
+# объект (попадание не тратит время на json.loads), и FLEET_FIGURE_CACHE_MB ограничивает объем
+# именно этих объектов: он в 2-7 раз больше их JSON. Объект общий для всех запросов,
+# поэтому изменять результат memoized нельзя
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get('FLEET_FIGURE_CACHE_MB', '64')) * 1024 * 1024
+# Необязательный дисковый уровень: включается заданием каталога
+FIGURE_CACHE_DIR = os.environ.get('FLEET_FIGURE_CACHE_DIR')
+FIGURE_CACHE_DISK_MAX_BYTES = int(os.environ.get('FLEET_FIGURE_CACHE_DISK_MB', '512')) * 1024 * 1024
+# Меняется при изменении построения графиков, чтобы не отдавать устаревшие
+FIGURE_CACHE_VERSION = 2
+
+_figure_cache = OrderedDict()
+_figure_cache_bytes = 0
+_figure_cache_lock = threading.Lock()
+figure_cache_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+def _figure_disk_path(cache_key):
+    digest = hashlib.blake2b(cache_key.encode(), digest_size=20).hexdigest()
+    return os.path.join(FIGURE_CACHE_DIR, f"{digest}.json")
+
+# Объем разобранного JSON в памяти процесса; общие объекты (повторяющиеся ключи) считаются один раз
+def json_object_nbytes(value, seen=None):
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(json_object_nbytes(key, seen) + json_object_nbytes(item, seen) for key, item in value.items())
+    elif isinstance(value, list):
+        size += sum(json_object_nbytes(item, seen) for item in value)
+    return size
+
+def _figure_cache_put(cache_key, payload):
+    global _figure_cache_bytes
+    
+    figure = json.loads(payload)
+    size = json_object_nbytes(figure)
+    with _figure_cache_lock:
+        previous = _figure_cache.pop(cache_key, None)
+        if previous is not None:
+            _figure_cache_bytes -= previous[0]
+        _figure_cache[cache_key] = (size, figure)
+        _figure_cache_bytes += size
         
-        # 1. График динамики пробега
-        trend_fig = go.Figure()
-        if 'mileage' in df.columns and period_col in df.columns:
-            try:
-                mileage_agg = df.groupby(period_col)['mileage'].mean().reset_index()
-                if not mileage_agg.empty:
-                    trend_fig = px.line(
-                        mileage_agg, 
-                        x=period_col, 
-                        y='mileage',
-                        title='📈 Динамика среднего пробега',
-                        labels={'mileage': 'Средний пробег (км)', period_col: 'Период'},
-                        markers=True
-                    )
-                    trend_fig.update_traces(line_color='#1e88e5', line_width=3)
-                    trend_fig.update_layout(hovermode='x unified')
-            except Exception as e:
-                print(f"Ошибка при создании графика пробега: {e}")
+        while _figure_cache_bytes > FIGURE_CACHE_MAX_BYTES and len(_figure_cache) > 1:
+            _, (size, _) = _figure_cache.popitem(last=False)
+            _figure_cache_bytes -= size
+            figure_cache_stats['evictions'] += 1
+    return figure
+
+def _figure_cache_get(cache_key):
+    with _figure_cache_lock:
+        cached = _figure_cache.get(cache_key)
+        if cached is not None:
+            _figure_cache.move_to_end(cache_key)
+            figure_cache_stats['memory_hits'] += 1
+            return cached[1]
+    
+    if FIGURE_CACHE_DIR:
+        path = _figure_disk_path(cache_key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = f.read()
+            os.utime(path)
+        except OSError:
+            payload = None
+        if payload is not None:
+            with _figure_cache_lock:
+                figure_cache_stats['disk_hits'] += 1
+            return _figure_cache_put(cache_key, payload)
+    
+    with _figure_cache_lock:
+        figure_cache_stats['misses'] += 1
+    return None
+
+def _figure_disk_put(cache_key, payload):
+    try:
+        os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+        path = _figure_disk_path(cache_key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
         
-        # 2. Распределение по типам ТС
-        pie_fig = go.Figure()
-        if 'vehicle_type' in df.columns:
+        # Удаляем давно не использованные файлы сверх лимита
+        files = [os.path.join(FIGURE_CACHE_DIR, name) for name in os.listdir(FIGURE_CACHE_DIR)
+                 if name.endswith('.json')]
+        stats = sorted((os.path.getmtime(p), os.path.getsize(p), p) for p in files)
+        total = sum(size for _, size, _ in stats)
+        for _, size, p in stats:
+            if total <= FIGURE_CACHE_DISK_MAX_BYTES:
+                break
+            os.remove(p)
+            total -= size
+    except OSError as e:
+        print(f"Не удалось сохранить график в дисковый кэш: {e}")
+
+# Результат build() из кэша или с построением; возвращается десериализованный JSON
+# Построения в процессе: параллельные запросы того же графика ждут одно построение
+_figure_pending = {}
+
+def figure_cache_key(dataset_key, figure_id, period):
+    return f"v{FIGURE_CACHE_VERSION}{FIGURE_TRANSPORT}:{dataset_key}:{period or ''}:{figure_id}"
+
+# Компактная передача графиков: числовые ряды трасс отправляются типизированными массивами
+# Plotly (base64) минимальной ширины, float округляются до FLEET_FIGURE_DECIMALS знаков
+# (пусто - без округления), из шаблона оформления остаются только типы трасс графика.
+# FLEET_COMPACT_FIGURES=0 отключает преобразование
+FIGURE_COMPACT = os.environ.get('FLEET_COMPACT_FIGURES', '1') != '0'
+FIGURE_DECIMALS = os.environ.get('FLEET_FIGURE_DECIMALS', '2')
+FIGURE_DECIMALS = int(FIGURE_DECIMALS) if FIGURE_DECIMALS else None
+# Настройки передачи входят в ключ кэша графиков
+FIGURE_TRANSPORT = f".{int(FIGURE_COMPACT)}.{FIGURE_DECIMALS}"
+# Короткие списки не кодируем: выигрыша нет, а часть атрибутов Plotly ждет обычные массивы
+TYPED_ARRAY_MIN_LENGTH = 16
+TYPED_ARRAY_DTYPES = {'i1': np.int8, 'u1': np.uint8, 'i2': np.int16, 'u2': np.uint16,
+                      'i4': np.int32, 'u4': np.uint32, 'f4': np.float32, 'f8': np.float64}
+
+def decode_typed_array(value):
+    array = np.frombuffer(base64.b64decode(value['bdata']), dtype=TYPED_ARRAY_DTYPES[value['dtype']])
+    if 'shape' in value:
+        array = array.reshape([int(n) for n in str(value['shape']).split(',')])
+    return array
+
+def encode_typed_array(array):
+    dtype = next(code for code, dt in TYPED_ARRAY_DTYPES.items() if array.dtype == dt)
+    value = {'dtype': dtype, 'bdata': base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')}
+    if array.ndim > 1:
+        value['shape'] = ', '.join(str(n) for n in array.shape)
+    return value
+
+# Самый узкий тип без потери значений (с учетом округления FIGURE_DECIMALS)
+def compact_array(array):
+    if array.dtype.kind == 'f' and array.size:
+        if FIGURE_DECIMALS is not None:
+            array = np.round(array, FIGURE_DECIMALS)
+        if np.isfinite(array).all() and np.abs(array).max() < 2 ** 31 and np.array_equal(array, np.round(array)):
+            array = array.astype(np.int64)
+        elif FIGURE_DECIMALS is not None and array.dtype == np.float64:
+            narrow = array.astype(np.float32)
+            if np.allclose(narrow, array, rtol=0, atol=0.5 * 10 ** -FIGURE_DECIMALS, equal_nan=True):
+                array = narrow
+    if array.dtype.kind in 'iu' and array.size:
+        low, high = array.min(), array.max()
+        for dtype in (np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                return array.astype(dtype)
+    return array
+
+def compact_value(value):
+    if isinstance(value, dict):
+        if 'bdata' in value and 'dtype' in value:
+            return encode_typed_array(compact_array(decode_typed_array(value)))
+        return {key: compact_value(item) for key, item in value.items()}
+    if (isinstance(value, (list, tuple)) and len(value) >= TYPED_ARRAY_MIN_LENGTH
+            and all(type(item) in (int, float) for item in value)):
+        return encode_typed_array(compact_array(np.asarray(value, dtype=np.float64)))
+    return value
+
+# Шаблон оформления без настроек для типов трасс, которых нет на графике
+def trim_template(layout, trace_types):
+    template = layout.get('template')
+    if not isinstance(template, dict) or 'data' not in template:
+        return layout
+    data = {name: traces for name, traces in template['data'].items() if name in trace_types}
+    return dict(layout, template=dict(template, data=data))
+
+def compact_figure(figure):
+    data = [compact_value(trace) for trace in figure.get('data', [])]
+    layout = trim_template(figure.get('layout', {}), {trace.get('type', 'scatter') for trace in data})
+    return dict(figure, data=data, layout=layout)
+
+def figure_payload(build):
+    value = build()
+    with timed('serialize'):
+        if FIGURE_COMPACT and isinstance(value, go.Figure):
+            value = compact_figure(value.to_plotly_json())
+        return json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder, ensure_ascii=False)
+
+def _store_figure(cache_key, payload):
+    if FIGURE_CACHE_DIR:
+        _figure_disk_put(cache_key, payload)
+    return _figure_cache_put(cache_key, payload)
+
+# Занять построение ключа: (Future, True) для владельца, (Future, False) если уже строится
+def _claim_figure_build(cache_key):
+    with _figure_cache_lock:
+        pending = _figure_pending.get(cache_key)
+        if pending is not None:
+            return pending, False
+        pending = _figure_pending[cache_key] = Future()
+        return pending, True
+
+# Ждущим передается уже разобранный объект из кэша
+def _finish_figure_build(cache_key, pending, payload=None, error=None):
+    figure = _store_figure(cache_key, payload) if error is None else None
+    with _figure_cache_lock:
+        _figure_pending.pop(cache_key, None)
+    if error is None:
+        pending.set_result(figure)
+    else:
+        pending.set_exception(error)
+    return figure
+
+def memoized(dataset_key, figure_id, period, build):
+    cache_key = figure_cache_key(dataset_key, figure_id, period)
+    figure = _figure_cache_get(cache_key)
+    if figure is None:
+        pending, owner = _claim_figure_build(cache_key)
+        if owner:
             try:
-                type_counts = df['vehicle_type'].value_counts().reset_index()
-                type_counts.columns = ['vehicle_type', 'count']
-                if not type_counts.empty:
-                    pie_fig = px.pie(
-                        type_counts,
-                        values='count',
-                        names='vehicle_type',
-                        title='🚘 Распределение по типам ТС',
-                        hole=0.3,
-                        color_discrete_sequence=px.colors.qualitative.Set3
-                    )
-                    pie_fig.update_traces(textposition='inside', textinfo='percent+label')
+                payload = figure_payload(build)
             except Exception as e:
-                print(f"Ошибка при создании круговой диаграммы: {e}")
-        
-        # 3. Расход топлива по типам ТС
-        fuel_fig = go.Figure()
-        if 'fuel_consumption' in df.columns and 'vehicle_type' in df.columns:
+                _finish_figure_build(cache_key, pending, error=e)
+                raise
+            figure = _finish_figure_build(cache_key, pending, payload)
+        else:
             try:
-                fuel_agg = df.groupby('vehicle_type')['fuel_consumption'].mean().reset_index()
-                if not fuel_agg.empty:
-                    fuel_fig = px.bar(
-                        fuel_agg.sort_values('fuel_consumption', ascending=False),
-                        x='vehicle_type',
-                        y='fuel_consumption',
-                        title='⛽ Средний расход топлива по типам ТС',
-                        labels={'fuel_consumption': 'Расход (л/100км)', 'vehicle_type': 'Тип ТС'},
-                        color='fuel_consumption',
-                        color_continuous_scale='RdYlGn_r'
-                    )
-                    fuel_fig.update_layout(xaxis_tickangle=-45)
+                figure = pending.result(timeout=FIGURE_WAIT_SECONDS)
             except Exception as e:
-                print(f"Ошибка при создании графика расхода топлива: {e}")
+                # Сбой или зависание чужого построения (например, в пуле) не мешает построить график здесь
+                print(f"Построение {figure_id} в пуле не завершилось ({e!r}), строим в запросе")
+                figure = _store_figure(cache_key, figure_payload(build))
+    return figure
+
+def clear_figure_cache():
+    global _figure_cache_bytes
+    with _figure_cache_lock:
+        _figure_cache.clear()
+        _figure_cache_bytes = 0
+
+def get_figure_cache_stats():
+    with _figure_cache_lock:
+        return dict(figure_cache_stats, entries=len(_figure_cache), bytes=_figure_cache_bytes)
+
+@server.route('/cache-stats')
+def cache_stats():
+    return jsonify({'figures': get_figure_cache_stats()})
+
+# Параллельное построение графиков дашборда: первый callback нового набора запускает
+# построение всех независимых графиков в пуле, остальные callback'и ждут готовый результат.
+# FLEET_FIGURE_WORKERS=0 отключает пул; FLEET_FIGURE_POOL=process строит графики в отдельных
+# процессах (набор они читают из дискового кэша Arrow), thread - в потоках этого процесса.
+# Дольше FLEET_FIGURE_WAIT_SECONDS callback результат пула не ждет и строит график сам
+FIGURE_WORKERS = int(os.environ.get('FLEET_FIGURE_WORKERS', '0'))
+FIGURE_POOL = os.environ.get('FLEET_FIGURE_POOL', 'thread')
+FIGURE_WAIT_SECONDS = float(os.environ.get('FLEET_FIGURE_WAIT_SECONDS', '30'))
+FIGURE_BUILDERS = {
+    'trend-data': build_trend_data,
+    'vehicle-type-distribution': build_type_distribution_figure,
+    'fuel-consumption': build_fuel_figure,
+    'maintenance-status': build_maintenance_figure,
+    'cost-breakdown': build_cost_figure,
+    'age-vs-mileage': build_scatter_figure
+}
+
+_figure_pool = None
+_figure_pool_lock = threading.Lock()
+
+def get_figure_pool():
+    global _figure_pool
+    with _figure_pool_lock:
+        if _figure_pool is None:
+            if FIGURE_POOL == 'process':
+                # fork из многопоточного воркера gunicorn копирует захваченные другими потоками
+                # блокировки, и процесс пула может зависнуть. forkserver запускает процессы
+                # из отдельного однопоточного сервера, app они импортируют заново
+                _figure_pool = ProcessPoolExecutor(max_workers=FIGURE_WORKERS,
+                                                   mp_context=multiprocessing.get_context('forkserver'))
+            else:
+                _figure_pool = ThreadPoolExecutor(max_workers=FIGURE_WORKERS, thread_name_prefix='figure')
+        return _figure_pool
+
+# Построение графика в процессе пула: набор ищется по ключу в памяти процесса или на диске,
+# окно дат строится в процессе пула по тем же границам
+def render_figure(dataset_key, figure_id, start_date=None, end_date=None):
+    entry = get_dataset(dataset_key)
+    if entry is None:
+        raise LookupError(f"набор данных {dataset_key} недоступен процессу пула")
+    window = dataset_window(entry, start_date, end_date)
+    return figure_payload(lambda: FIGURE_BUILDERS[figure_id](window))
+
+# Запуск построения всех еще не готовых графиков окна дат, не дожидаясь результата.
+# Ошибка одного графика не влияет на остальные: ждущий callback построит его сам
+def prewarm_figures(entry, start_date=None, end_date=None):
+    if FIGURE_WORKERS <= 0:
+        return
+    
+    window = dataset_window(entry, start_date, end_date)
+    pool = get_figure_pool()
+    for figure_id, builder in FIGURE_BUILDERS.items():
+        cache_key = figure_cache_key(window['key'], figure_id, None)
+        with _figure_cache_lock:
+            if cache_key in _figure_cache or cache_key in _figure_pending:
+                continue
+        pending, owner = _claim_figure_build(cache_key)
+        if not owner:
+            continue
         
-        # 4. Статус технического обслуживания
-        status_fig = go.Figure()
-        if 'maintenance_status' in df.columns:
-            try:
-                status_counts = df['maintenance_status'].value_counts().reset_index()
-                status_counts.columns = ['status', 'count']
-                if not status_counts.empty:
-                    colors = {'Исправен': '#4caf50', 'Требуется ТО': '#ff9800', 'На ремонте': '#f44336'}
-                    status_fig = px.bar(
-                        status_counts,
-                        x='status',
-                        y='count',
-                        title='🔧 Статус технического обслуживания',
-                        labels={'count': 'Количество ТС', 'status': 'Статус'},
-                        color='status',
-                        color_discrete_map=colors
-                    )
-                    status_fig.update_layout(showlegend=False)
-            except Exception as e:
-                print(f"Ошибка при создании графика статусов: {e}")
+        if FIGURE_POOL == 'process':
+            future = pool.submit(render_figure, entry['key'], figure_id, start_date, end_date)
+        else:
+            future = pool.submit(figure_payload, functools.partial(builder, window))
+        future.add_done_callback(functools.partial(_complete_prewarm, cache_key, pending, figure_id))
+
+def _complete_prewarm(cache_key, pending, figure_id, future):
+    error = future.exception()
+    if error is not None:
+        print(f"Ошибка при построении графика {figure_id} в пуле: {error}")
+        _finish_figure_build(cache_key, pending, error=error)
+    else:
+        _finish_figure_build(cache_key, pending, future.result())
+
+# Callback'и дашборда разделены по зависимостям. Динамика пробега: сервер один раз на набор
+# отдает ряды всех периодов, а смена периода перерисовывает график в браузере
+@app.callback(
+    Output('trend-data', 'data'),
+    [Input('stored-data', 'data'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')]
+)
+@profiled
+def update_trend_data(stored_data, start_date, end_date):
+    try:
+        entry, placeholder = resolve_dataset(stored_data, start_date, end_date)
+        if entry is None:
+            return {'placeholder': placeholder.to_plotly_json()}
+        return memoized(entry['key'], 'trend-data', None, lambda: build_trend_data(entry))
+    except Exception as e:
+        print(f"Критическая ошибка в update_trend_data: {e}")
+        traceback.print_exc()
+        return {'placeholder': error_figure().to_plotly_json()}
+
+app.clientside_callback(
+    """
+    function(trendData, period) {
+        if (!trendData) {
+            return window.dash_clientside.no_update;
+        }
+        if (trendData.placeholder) {
+            return trendData.placeholder;
+        }
+        var series = trendData.series[period];
+        var layout = Object.assign({}, trendData.layout);
+        if (!series) {
+            return {data: [], layout: layout};
+        }
+        var trace = {
+            type: 'scatter',
+            x: series.x,
+            y: series.y,
+            line: {color: '#1e88e5', width: 3},
+            showlegend: false
+        };
+        if (series.labels) {
+            // Прореженный ряд: ось по номерам периодов, подписи и всплывающие подсказки по меткам
+            trace.mode = series.full ? 'lines+markers' : 'lines';
+            trace.customdata = series.labels;
+            trace.hovertemplate = '%{customdata}<br>Средний пробег: %{y:,.0f} км<extra></extra>';
+            layout.xaxis = Object.assign({}, layout.xaxis, {
+                tickmode: 'array', tickvals: series.tickvals, ticktext: series.ticktext
+            });
+            layout.hovermode = 'closest';
+        } else {
+            trace.mode = 'lines+markers';
+            trace.hovertemplate = 'Период=%{x}<br>Средний пробег (км)=%{y}<extra></extra>';
+            layout.hovermode = 'x unified';
+        }
+        layout.title = {text: trendData.title + (series.note || '')};
+        layout.uirevision = trendData.key + ':' + period;
+        return {data: [trace], layout: layout};
+    }
+    """,
+    Output('mileage-trend', 'figure'),
+    [Input('trend-data', 'data'),
+     Input('period-selector', 'value')]
+)
+
+# Приближение прореженного ряда: участок в полном разрешении считается на сервере
+@app.callback(
+    Output('mileage-trend', 'figure', allow_duplicate=True),
+    [Input('mileage-trend', 'relayoutData')],
+    [State('stored-data', 'data'),
+     State('period-selector', 'value'),
+     State('date-range', 'start_date'),
+     State('date-range', 'end_date')],
+    prevent_initial_call=True
+)
+@profiled
+def update_trend_zoom(relayout_data, stored_data, period, start_date, end_date):
+    try:
+        relayout_data = relayout_data or {}
+        x_range = relayout_x_range(relayout_data)
+        if x_range is None and not relayout_data.get('xaxis.autorange'):
+            return dash.no_update
         
-        # 5. Структура затрат
-        cost_fig = go.Figure()
-        cost_columns = ['fuel_cost', 'maintenance_cost']
-        available_cost_cols = [col for col in cost_columns if col in df.columns]
+        entry = get_dataset(stored_data)
+        if entry is None:
+            return dash.no_update
+        entry = dataset_window(entry, start_date, end_date)
         
-        if available_cost_cols:
-            try:
-                costs = {}
-                for col in available_cost_cols:
-                    cost_name = 'Топливо' if 'fuel' in col else 'Ремонт'
-                    costs[cost_name] = df[col].sum()
-                
-                if costs:
-                    cost_df = pd.DataFrame(list(costs.items()), columns=['category', 'amount'])
-                    cost_fig = px.pie(
-                        cost_df,
-                        values='amount',
-                        names='category',
-                        title='💰 Структура затрат',
-                        hole=0.4,
-                        color_discrete_sequence=['#FF6B6B', '#4ECDC4']
-                    )
-                    cost_fig.update_traces(textposition='inside', textinfo='percent+label')
-            except Exception as e:
-                print(f"Ошибка при создании графика затрат: {e}")
+        # Короткие ряды уже отданы полностью, приближение обрабатывает сам Plotly
+        series = memoized(entry['key'], 'trend-data', None, lambda: build_trend_data(entry))['series'].get(period)
+        if not series or 'labels' not in series:
+            return dash.no_update
         
-        # 6. Зависимость пробега от возраста
-        scatter_fig = go.Figure()
-        if all(col in df.columns for col in ['vehicle_age', 'mileage']):
-            try:
-                scatter_fig = px.scatter(
-                    df,
-                    x='vehicle_age',
-                    y='mileage',
-                    color='vehicle_type' if 'vehicle_type' in df.columns else None,
-                    size='fuel_consumption' if 'fuel_consumption' in df.columns else None,
-                    title='📊 Зависимость пробега от возраста ТС',
-                    labels={'vehicle_age': 'Возраст (лет)', 'mileage': 'Пробег (км)'},
-                    hover_data=['vehicle_id'] if 'vehicle_id' in df.columns else None,
-                    trendline='ols'
-                )
-                scatter_fig.update_traces(marker=dict(opacity=0.7, line=dict(width=1, color='DarkSlateGrey')))
-            except Exception as e:
-                print(f"Ошибка при создании scatter графика: {e}")
+        if x_range is None:
+            return memoized(entry['key'], 'mileage-trend', period, lambda: build_trend_figure(entry, period))
+        trend_fig = build_trend_figure(entry, period, x_range)
+        return compact_figure(trend_fig.to_plotly_json()) if FIGURE_COMPACT else trend_fig
+    except Exception as e:
+        print(f"Критическая ошибка в update_trend_zoom: {e}")
+        traceback.print_exc()
+        return dash.no_update
+
+@app.callback(
+    [Output('vehicle-type-distribution', 'figure'),
+     Output('fuel-consumption', 'figure'),
+     Output('maintenance-status', 'figure')],
+    [Input('stored-data', 'data'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')]
+)
+@profiled
+def update_type_figures(stored_data, start_date, end_date):
+    try:
+        entry, placeholder = resolve_dataset(stored_data, start_date, end_date)
+        if entry is None:
+            return [placeholder] * 3
+        return [memoized(entry['key'], 'vehicle-type-distribution', None, lambda: build_type_distribution_figure(entry)),
+                memoized(entry['key'], 'fuel-consumption', None, lambda: build_fuel_figure(entry)),
+                memoized(entry['key'], 'maintenance-status', None, lambda: build_maintenance_figure(entry))]
+    except Exception as e:
+        print(f"Критическая ошибка в update_type_figures: {e}")
+        traceback.print_exc()
+        return [error_figure()] * 3
+
+@app.callback(
+    Output('cost-breakdown', 'figure'),
+    [Input('stored-data', 'data'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')]
+)
+@profiled
+def update_cost_figure(stored_data, start_date, end_date):
+    try:
+        entry, placeholder = resolve_dataset(stored_data, start_date, end_date)
+        if entry is None:
+            return placeholder
+        return memoized(entry['key'], 'cost-breakdown', None, lambda: build_cost_figure(entry))
+    except Exception as e:
+        print(f"Критическая ошибка в update_cost_figure: {e}")
+        traceback.print_exc()
+        return error_figure()
+
+@app.callback(
+    Output('age-vs-mileage', 'figure'),
+    [Input('stored-data', 'data'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')]
+)
+@profiled
+def update_scatter(stored_data, start_date, end_date):
+    try:
+        entry, placeholder = resolve_dataset(stored_data, start_date, end_date)
+        if entry is None:
+            return placeholder
+        return memoized(entry['key'], 'age-vs-mileage', None, lambda: build_scatter_figure(entry))
+    except Exception as e:
+        print(f"Критическая ошибка в update_scatter: {e}")
+        traceback.print_exc()
+        return error_figure()
+
+@app.callback(
+    [Output('total-vehicles', 'children'),
+     Output('avg-mileage', 'children'),
+     Output('utilization-rate', 'children'),
+     Output('total-costs', 'children'),
+     Output('data-info', 'children')],
+    [Input('stored-data', 'data'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date')]
+)
+@profiled
+def update_kpis(stored_data, start_date, end_date):
+    try:
+        if not stored_data:
+            return ["0", "0 км", "0%", "0 ₽", "Нет данных"]
         
-        # Подготовка данных для таблицы
-        table_data = df.to_dict('records')
+        entry = get_dataset(stored_data)
+        if entry is None:
+            return ["Н/Д", "Н/Д", "Н/Д", "Н/Д", DATASET_EXPIRED_MESSAGE]
+        entry = dataset_window(entry, start_date, end_date)
         
-        # Форматирование колонок для таблицы
-        table_columns = []
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                column_def = {
-                    'name': col,
-                    'id': col,
-                    'type': 'numeric',
-                    'format': {'specifier': ',.0f'} if 'cost' in col.lower() or 'mileage' in col.lower() else {'specifier': ',.1f'}
-                }
+        return memoized(entry['key'], 'kpis', None, lambda: build_kpis(entry))
+    except Exception as e:
+        print(f"Критическая ошибка в update_kpis: {e}")
+        traceback.print_exc()
+        return ["Ошибка", "Ошибка", "Ошибка", "Ошибка", f"Ошибка: {str(e)}"]
+
+# Границы выбора дат по новому набору; выбранное окно при смене набора сбрасывается
+@app.callback(
+    [Output('date-range', 'min_date_allowed'),
+     Output('date-range', 'max_date_allowed'),
+     Output('date-range', 'initial_visible_month'),
+     Output('date-range', 'start_date'),
+     Output('date-range', 'end_date'),
+     Output('date-range', 'disabled')],
+    [Input('stored-data', 'data')]
+)
+@profiled
+def update_date_range(stored_data):
+    try:
+        entry = get_dataset(stored_data)
+        bounds = date_bounds(entry) if entry is not None else None
+    except Exception as e:
+        print(f"Ошибка при построении индекса дат: {e}")
+        traceback.print_exc()
+        bounds = None
+    if bounds is None:
+        return None, None, None, None, None, True
+    return bounds[0], bounds[1], bounds[1], None, None, False
+
+@app.callback(
+    Output('vehicles-table', 'columns'),
+    [Input('stored-data', 'data')]
+)
+@profiled
+def update_table_columns(stored_data):
+    entry = get_dataset(stored_data)
+    if entry is None:
+        return []
+    return build_table_columns(entry)
+
+# Разбор filter_query таблицы (тот же синтаксис, что и в style_data_conditional)
+FILTER_OPERATORS = ['>=', '<=', '!=', '<', '>', '=', 'ge', 'le', 'ne', 'lt', 'gt', 'eq',
+                    'contains', 'datestartswith']
+FILTER_OPERATOR_ALIASES = {'ge': '>=', 'le': '<=', 'ne': '!=', 'lt': '<', 'gt': '>', 'eq': '='}
+FILTER_PART_RE = re.compile(
+    r'^\{(?P<column>[^}]+)\}\s*(?P<operator>[is]?(?:' +
+    '|'.join(re.escape(op) for op in FILTER_OPERATORS) +
+    r'))\s*(?P<value>.*)$'
+)
+# Унарные операторы DataTable: {col} is blank, {col} is not nil и т.д.
+FILTER_UNARY_OPERATORS = ['blank', 'nil', 'even', 'odd']
+FILTER_UNARY_RE = re.compile(r'^\{(?P<column>[^}]+)\}\s+is\s+(?P<negate>not\s+)?(?P<operator>\w+)$')
+
+def split_filter_part(filter_part):
+    match = FILTER_UNARY_RE.match(filter_part.strip())
+    if match:
+        if match.group('operator') not in FILTER_UNARY_OPERATORS:
+            return None, None, None
+        operator = 'is not ' if match.group('negate') else 'is '
+        return match.group('column'), operator + match.group('operator'), (None, True)
+    
+    match = FILTER_PART_RE.match(filter_part.strip())
+    if not match:
+        return None, None, None
+    
+    operator = match.group('operator')
+    # Префиксы i/s задают чувствительность к регистру
+    case_sensitive = not operator.startswith('i')
+    if operator[0] in 'is' and operator[1:] in FILTER_OPERATORS:
+        operator = operator[1:]
+    operator = FILTER_OPERATOR_ALIASES.get(operator, operator)
+    
+    value = match.group('value').strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'", '`'):
+        value = value[1:-1].replace('\\' + value[0], value[0])
+    
+    return match.group('column'), operator, (value, case_sensitive)
+
+def _comparison_mask(series, operator, value, case_sensitive):
+    if operator == 'contains':
+        return category_mask(series, lambda s: s.str.contains(value, case=case_sensitive, regex=False, na=False))
+    
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if operator == 'datestartswith':
+            # Префикс строки даты ('2024-0' - январь-сентябрь), строки формируются
+            # только для уникальных дат, а не для каждой строки набора
+            codes, uniques = pd.factorize(series)
+            text_mask = pd.Series(uniques.astype(str)).str.startswith(value).to_numpy(dtype=bool)
+            return np.where(codes >= 0, text_mask[codes], False)
+        operand = pd.Timestamp(value)
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        operand = float(value)
+        # float32-колонки сравниваем с операндом того же типа, иначе 8.2 != float32(8.2)
+        if pd.api.types.is_float_dtype(series):
+            operand = series.dtype.type(operand)
+    else:
+        if operator == 'datestartswith':
+            return category_mask(series, lambda s: s.str.startswith(value, na=False))
+        if not case_sensitive:
+            return category_mask(series, lambda s: _compare(s.str.lower(), operator, value.lower()))
+        return category_mask(series, lambda s: _compare(s, operator, value))
+    
+    return _compare(series, operator, operand).to_numpy(dtype=bool)
+
+def _unary_mask(series, operator):
+    name = operator.split()[-1]
+    numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+    if name in ('even', 'odd'):
+        # Как в DataTable: четность есть только у целых чисел
+        if numeric:
+            mask = (series % 2 == (0 if name == 'even' else 1)).to_numpy(dtype=bool)
+        else:
+            mask = np.zeros(len(series), dtype=bool)
+    else:
+        mask = series.isna().to_numpy(dtype=bool)
+        if name == 'blank' and not numeric and not pd.api.types.is_datetime64_any_dtype(series):
+            mask = mask | category_mask(series, lambda s: s.str.strip() == '')
+    
+    return ~mask if operator.startswith('is not') else mask
+
+def _compare(series, operator, operand):
+    if operator == '=':
+        return series == operand
+    if operator == '!=':
+        return series != operand
+    if operator == '<':
+        return series < operand
+    if operator == '<=':
+        return series <= operand
+    if operator == '>':
+        return series > operand
+    return series >= operand
+
+# Превращение filter_query в векторизованную булеву маску по DataFrame
+def filter_query_mask(df, filter_query):
+    mask = np.ones(len(df), dtype=bool)
+    if not filter_query:
+        return mask
+    
+    for filter_part in filter_query.split(' && '):
+        column, operator, operand = split_filter_part(filter_part)
+        if column is None or column not in df.columns:
+            # Неподдерживаемый оператор не пропускается молча: таблица, показанная
+            # без фильтра, выглядела бы как результат фильтрации
+            print(f"Не удалось применить фильтр: {filter_part}")
+            mask[:] = False
+            continue
+        
+        value, case_sensitive = operand
+        try:
+            if operator.startswith('is '):
+                mask &= _unary_mask(df[column], operator)
             else:
-                column_def = {'name': col, 'id': col}
-            table_columns.append(column_def)
+                mask &= _comparison_mask(df[column], operator, value, case_sensitive)
+        except (ValueError, TypeError) as e:
+            # Некорректное значение фильтра (например, текст в числовой колонке) ничего не находит
+            print(f"Ошибка в фильтре {filter_part}: {e}")
+            mask[:] = False
+    
+    return mask
+
+# Серверная пагинация, сортировка и фильтрация таблицы
+@app.callback(
+    [Output('vehicles-table', 'data'),
+     Output('vehicles-table', 'page_count'),
+     Output('vehicles-table', 'page_current')],
+    [Input('stored-data', 'data'),
+     Input('date-range', 'start_date'),
+     Input('date-range', 'end_date'),
+     Input('vehicles-table', 'page_current'),
+     Input('vehicles-table', 'page_size'),
+     Input('vehicles-table', 'sort_by'),
+     Input('vehicles-table', 'filter_query')]
+)
+@profiled
+def update_table(stored_data, start_date, end_date, page_current, page_size, sort_by, filter_query):
+    entry = get_dataset(stored_data)
+    if entry is None:
+        return [], 0, 0
+    
+    try:
+        # Фильтр и сортировка работают только по строкам окна дат
+        df = dataset_window(entry, start_date, end_date)['df']
         
-        # Расчет показателей KPI
-        total_vehicles = str(df['vehicle_id'].nunique()) if 'vehicle_id' in df.columns else str(len(df))
+        # При смене данных, окна дат или фильтра возвращаемся на первую страницу
+        ctx = dash.callback_context
+        triggered = {t['prop_id'] for t in ctx.triggered} if ctx.triggered else set()
+        if triggered & {'stored-data.data', 'date-range.start_date', 'date-range.end_date',
+                        'vehicles-table.filter_query'}:
+            page_current = 0
         
-        avg_mileage = "Н/Д"
-        if 'mileage' in df.columns and not df['mileage'].isnull().all():
-            avg_mileage_value = df['mileage'].mean()
-            avg_mileage = f"{avg_mileage_value:,.0f} км" if not pd.isna(avg_mileage_value) else "Н/Д"
+        with timed('table_filter_sort'):
+            if filter_query:
+                df = df[filter_query_mask(df, filter_query)]
+            
+            sort_by = [s for s in (sort_by or []) if s['column_id'] in df.columns]
+            if sort_by:
+                df = df.sort_values(
+                    [s['column_id'] for s in sort_by],
+                    ascending=[s['direction'] == 'asc' for s in sort_by],
+                    kind='mergesort'
+                )
         
-        # Коэффициент использования
-        utilization_rate = "Н/Д"
-        if 'status' in df.columns:
-            working = df[df['status'].astype(str).str.contains('работе', case=False, na=False)].shape[0]
-            total = len(df)
-            utilization = (working / total * 100) if total > 0 else 0
-            utilization_rate = f"{utilization:.1f}%"
+        page_size = page_size or 10
+        page_count = max(1, -(-len(df) // page_size))
+        page_current = min(page_current or 0, page_count - 1)
         
-        # Общие затраты
-        total_costs = 0
-        if 'fuel_cost' in df.columns:
-            total_costs += df['fuel_cost'].sum()
-        if 'maintenance_cost' in df.columns:
-            total_costs += df['maintenance_cost'].sum()
+        start = page_current * page_size
+        page = df.iloc[start:start + page_size]
         
-        total_costs_display = f"{total_costs:,.0f} ₽" if total_costs > 0 else "Н/Д"
+        with timed('table_serialize'):
+            records = page.to_dict('records')
         
-        return [trend_fig, pie_fig, fuel_fig, status_fig, cost_fig, scatter_fig, 
-                table_data, table_columns, total_vehicles, avg_mileage, 
-                utilization_rate, total_costs_display, data_info]
+        return records, page_count, page_current
         
     except Exception as e:
-        print(f"Критическая ошибка в update_dashboard: {e}")
+        print(f"Ошибка при обновлении таблицы: {e}")
         traceback.print_exc()
-        
-        # Возвращаем пустые графики при ошибке
-        empty_fig = go.Figure()
-        empty_fig.update_layout(
-            title="Ошибка при обработке данных",
-            annotations=[dict(
-                text="Произошла ошибка при обработке данных",
-                xref="paper", yref="paper",
-                x=0.5, y=0.5, showarrow=False
-            )]
-        )
-        
-        return [empty_fig] * 6 + [[], [], "Ошибка", "Ошибка", "Ошибка", "Ошибка", f"Ошибка: {str(e)}"]
+        return [], 0, 0
 
+# Режим разработки. Для production: gunicorn -c gunicorn.conf.py app:server
 if __name__ == '__main__':
     app.run(
         debug=True,
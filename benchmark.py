@@ -0,0 +1,424 @@
+# Воспроизводимый бенчмарк дашборда на синтетическом автопарке, без браузера и сети.
+#
+#   python benchmark.py --sizes 100x12 1000x36 10000x36 --output results.json
+#   python benchmark.py --compare results.json
+#
+# Генератор повторяет схему dash.csv (русские значения категорий, скошенные распределения).
+# Для каждого размера замеряются разбор CSV, построение агрегатов, каждый график, KPI,
+# страница таблицы и окно дат (индекс, срез и графики окна), а также размер JSON каждого ответа. Результаты пишутся в JSON,
+# чтобы сравнивать версии между собой. С --figure-workers дополнительно сравнивается
+# полное обновление дашборда (все графики нового набора) без пула и с пулом:
+#
+#   python benchmark.py --sizes 10000x36 --figure-workers 4 --figure-pool process
+#
+# С --upload-memory для каждого размера сравнивается пиковая память сервера при загрузке
+# файла через потоковый маршрут /upload и через callback dcc.Upload (base64 в JSON).
+# С --transport сравнивается передача графиков: байты ответа без сжатия, gzip и brotli
+# и время декодирования на стороне клиента (JSON и типизированные массивы, замер в Python)
+# для обычной и компактной сериализации.
+import argparse
+import base64
+import contextlib
+import functools
+import gzip
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+VEHICLE_TYPES = {
+    # тип: (доля в парке, средний расход л/100км, средний пробег за месяц)
+    'Легковой': (0.55, 8.5, 2500),
+    'Грузовой': (0.30, 24.0, 6000),
+    'Микроавтобус': (0.15, 13.5, 4000)
+}
+MAINTENANCE_STATUSES = {'Исправен': 0.78, 'Требуется ТО': 0.15, 'На ремонте': 0.07}
+FUEL_PRICE = 55.0
+MISSING_RATE = 0.002
+
+# Синтетический автопарк: n_vehicles ТС, по одной записи на ТС в каждом из n_months месяцев
+def generate_fleet(n_vehicles, n_months, seed=0):
+    rng = np.random.default_rng(seed)
+    
+    type_names = list(VEHICLE_TYPES)
+    type_shares = np.array([VEHICLE_TYPES[name][0] for name in type_names])
+    vehicle_types = rng.choice(len(type_names), size=n_vehicles, p=type_shares)
+    consumption_base = np.array([VEHICLE_TYPES[name][1] for name in type_names])[vehicle_types]
+    monthly_base = np.array([VEHICLE_TYPES[name][2] for name in type_names])[vehicle_types]
+    
+    # Возраст скошен к новым ТС, интенсивность использования - логнормальная
+    start_age = np.minimum(rng.geometric(0.22, size=n_vehicles), 20)
+    intensity = rng.lognormal(0.0, 0.35, size=n_vehicles)
+    start_mileage = start_age * 12 * monthly_base * intensity * rng.uniform(0.8, 1.2, size=n_vehicles)
+    
+    months = np.arange(n_months)
+    dates = pd.date_range('2022-01-01', periods=n_months, freq='MS')
+    monthly_mileage = monthly_base[None, :] * intensity[None, :] * rng.gamma(8.0, 1 / 8.0, size=(n_months, n_vehicles))
+    mileage = start_mileage[None, :] + np.cumsum(monthly_mileage, axis=0)
+    age = start_age[None, :] + months[:, None] // 12
+    
+    consumption = consumption_base[None, :] * (1 + 0.01 * age) * rng.normal(1.0, 0.07, size=(n_months, n_vehicles))
+    fuel_cost = monthly_mileage * consumption / 100 * FUEL_PRICE
+    
+    statuses = list(MAINTENANCE_STATUSES)
+    maintenance = rng.choice(len(statuses), size=(n_months, n_vehicles), p=list(MAINTENANCE_STATUSES.values()))
+    # Затраты на ремонт с тяжелым хвостом, у ТС на ремонте заметно выше
+    maintenance_cost = rng.pareto(2.5, size=(n_months, n_vehicles)) * 4000 * (1 + 4 * (maintenance == 2))
+    status = np.where(maintenance == 2, 'На ремонте', 'В работе')
+    
+    df = pd.DataFrame({
+        'date': np.repeat(dates.strftime('%Y-%m-%d').to_numpy(), n_vehicles),
+        'vehicle_id': np.tile(np.char.add('V', np.char.zfill(np.arange(1, n_vehicles + 1).astype(str), 5)), n_months),
+        'vehicle_type': np.tile(np.array(type_names)[vehicle_types], n_months),
+        'mileage': np.round(mileage.ravel()).astype(np.int64),
+        'fuel_consumption': np.round(consumption.ravel(), 1),
+        'fuel_cost': np.round(fuel_cost.ravel()).astype(np.int64),
+        'maintenance_cost': np.round(maintenance_cost.ravel()).astype(np.int64),
+        'maintenance_status': np.array(statuses)[maintenance.ravel()],
+        'status': status.ravel(),
+        'vehicle_age': age.ravel()
+    })
+    
+    # Немного пропусков, как в реальных выгрузках
+    for col in ['mileage', 'fuel_consumption', 'maintenance_status']:
+        missing = rng.random(len(df)) < MISSING_RATE
+        df[col] = df[col].astype(object).where(~missing, None) if col == 'maintenance_status' else df[col].where(~missing)
+    
+    return df
+
+def best_of(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+def payload_size(value):
+    import plotly.utils
+    return len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8'))
+
+# Все независимые графики набора с пустым кэшем графиков, как после загрузки файла
+def dashboard_refresh(app, entry):
+    app.clear_figure_cache()
+    entry.pop('trendlines', None)
+    app.prewarm_figures(entry)
+    for figure_id, builder in app.FIGURE_BUILDERS.items():
+        app.memoized(entry['key'], figure_id, None, functools.partial(builder, entry))
+
+# Разбор ответа как на клиенте: JSON, затем base64 типизированных массивов в числовые буферы
+def decode_response(app, body):
+    def walk(value):
+        if isinstance(value, dict):
+            if 'bdata' in value and 'dtype' in value:
+                return app.decode_typed_array(value)
+            return {key: walk(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        return value
+    return walk(json.loads(body))
+
+def figure_transport(app, entry, repeat):
+    from dash._utils import to_json
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    
+    result = {}
+    for figure_id, builder in app.FIGURE_BUILDERS.items():
+        result[figure_id] = {}
+        for mode, compact in (('plain', False), ('compact', True)):
+            app.FIGURE_COMPACT = compact
+            entry.pop('trendlines', None)
+            # Тело ответа Dash: так же, как callback отдает значение из кэша графиков
+            body = to_json(json.loads(app.figure_payload(functools.partial(builder, entry)))).encode('utf-8')
+            packed = gzip.compress(body, compresslevel=6)
+            sizes = {'raw': len(body), 'gzip': len(packed)}
+            if brotli is not None:
+                sizes['br'] = len(brotli.compress(body, quality=5))
+            sizes['decode_ms'], _ = best_of(lambda: decode_response(app, gzip.decompress(packed)), repeat)
+            result[figure_id][mode] = sizes
+    app.FIGURE_COMPACT = True
+    return result
+
+def set_figure_pool(app, workers, pool):
+    if app._figure_pool is not None:
+        app._figure_pool.shutdown()
+        app._figure_pool = None
+    app.FIGURE_WORKERS, app.FIGURE_POOL = workers, pool
+
+def run_size(app, n_vehicles, n_months, repeat, seed, figure_workers=0, figure_pool='thread', transport=False):
+    df = generate_fleet(n_vehicles, n_months, seed)
+    csv_bytes = df.to_csv(index=False).encode('utf-8')
+    contents = 'data:text/csv;base64,' + base64.b64encode(csv_bytes).decode()
+    
+    timings = {}
+    payloads = {}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    
+    with quiet:
+        timings['ingest'], parsed = best_of(lambda: app.parse_contents(contents, 'fleet.csv'), repeat)
+        timings['register'], key = best_of(lambda: app.register_dataset(parsed), repeat)
+        # Процессам пула набор доступен только через дисковый кэш
+        if figure_workers and figure_pool == 'process':
+            key = app.register_dataset(parsed, app.content_key(csv_bytes), persist=True)
+    entry = app.get_dataset(key)
+    
+    builders = {
+        'trend-data': lambda: app.build_trend_data(entry),
+        'mileage-trend:month': lambda: app.build_trend_figure(entry, 'month'),
+        'mileage-trend:week': lambda: app.build_trend_figure(entry, 'week'),
+        'vehicle-type-distribution': lambda: app.build_type_distribution_figure(entry),
+        'fuel-consumption': lambda: app.build_fuel_figure(entry),
+        'maintenance-status': lambda: app.build_maintenance_figure(entry),
+        'cost-breakdown': lambda: app.build_cost_figure(entry),
+        'age-vs-mileage': lambda: (entry.pop('trendlines', None), app.build_scatter_figure(entry))[1],
+        'kpis': lambda: app.build_kpis(entry),
+        'table-columns': lambda: app.build_table_columns(entry)
+    }
+    for name, build in builders.items():
+        timings[name], value = best_of(build, repeat)
+        started = time.perf_counter()
+        payloads[name] = payload_size(value)
+        timings[f'{name}:serialize'] = (time.perf_counter() - started) * 1000
+    
+    # Страница таблицы с фильтром и сортировкой, как при работе пользователя
+    def table_page():
+        mask = app.filter_query_mask(entry['df'], '{vehicle_type} = "Грузовой" && {fuel_consumption} > 20')
+        page = entry['df'][mask].sort_values('mileage', ascending=False, kind='mergesort').iloc[:10]
+        return page.to_dict('records')
+    timings['table-page'], records = best_of(table_page, repeat)
+    payloads['table-page'] = payload_size(records)
+    
+    # Окно дат (последний квартал): индекс строится один раз на набор, само окно -
+    # двоичный поиск по дням и разности накопленных сумм
+    timings['date-index'], index = best_of(lambda: (entry.pop('date_index', None), app.date_index(entry))[1], repeat)
+    if index is not None:
+        start, end = str(index['days'][max(0, len(index['days']) - 3)]), str(index['days'][-1])
+        timings['window'], window = best_of(lambda: (entry.pop('windows', None),
+                                                     app.dataset_window(entry, start, end))[1], repeat)
+        def window_refresh():
+            window.pop('trendlines', None)
+            for builder in app.FIGURE_BUILDERS.values():
+                builder(window)
+            return app.build_kpis(window)
+        timings['window:refresh'], _ = best_of(window_refresh, repeat)
+    
+    if figure_workers:
+        with quiet:
+            set_figure_pool(app, 0, figure_pool)
+            timings['refresh:serial'], _ = best_of(lambda: dashboard_refresh(app, entry), repeat)
+            set_figure_pool(app, figure_workers, figure_pool)
+            # Первый прогон запускает процессы или потоки пула и в замер не входит
+            dashboard_refresh(app, entry)
+            timings[f'refresh:{figure_pool}x{figure_workers}'], _ = best_of(lambda: dashboard_refresh(app, entry), repeat)
+            set_figure_pool(app, 0, figure_pool)
+    
+    result = {
+        'vehicles': n_vehicles,
+        'months': n_months,
+        'rows': len(df),
+        'csv_bytes': len(csv_bytes),
+        'dataset_bytes': entry['nbytes'],
+        'timings_ms': {name: round(value, 3) for name, value in timings.items()},
+        'payload_bytes': payloads
+    }
+    if transport:
+        result['transport'] = figure_transport(app, entry, repeat)
+    return result
+
+# Поле /proc/self/status в байтах (Linux)
+def proc_status_bytes(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+
+# Загрузка файла в отдельном процессе; печатает прирост пикового RSS после импорта app.
+# Пик сбрасывается через clear_refs, чтобы не учитывать временные пики импорта библиотек
+def upload_memory_child(mode, path):
+    # Разбор в запросе, как без менеджера фоновых задач, чтобы весь путь был в этом процессе
+    sys.modules['diskcache'] = None
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+        client = app.server.test_client()
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = proc_status_bytes('VmRSS')
+        
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            if mode == 'upload-route':
+                response = client.post('/upload?filename=fleet.csv', input_stream=f,
+                                       content_type='text/csv', content_length=size)
+                key = response.get_json()['key']
+            else:
+                response = client.post('/_dash-update-component', input_stream=f,
+                                       content_type='application/json', content_length=size)
+                key = response.get_json()['response']['stored-data']['data']
+        peak = proc_status_bytes('VmHWM')
+    
+    print(json.dumps({'peak_rss_bytes': peak - baseline,
+                      'dataset_bytes': app.get_dataset(key)['nbytes']}))
+
+def upload_memory(n_vehicles, n_months, seed):
+    df = generate_fleet(n_vehicles, n_months, seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'fleet.csv')
+        df.to_csv(csv_path, index=False)
+        del df
+        
+        # Тело запроса callback'а dcc.Upload, как его отправляет браузер
+        body_path = os.path.join(tmp, 'callback.json')
+        with open(csv_path, 'rb') as f:
+            contents = 'data:text/csv;base64,' + base64.b64encode(f.read()).decode()
+        with open(body_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'output': '..stored-data.data...error-message.children...error-message.style..',
+                'outputs': [{'id': 'stored-data', 'property': 'data'},
+                            {'id': 'error-message', 'property': 'children'},
+                            {'id': 'error-message', 'property': 'style'}],
+                'inputs': [{'id': 'upload-data', 'property': 'contents', 'value': contents}],
+                'state': [{'id': 'upload-data', 'property': 'filename', 'value': 'fleet.csv'},
+                          {'id': 'upload-mode', 'property': 'value', 'value': 'replace'},
+                          {'id': 'stored-data', 'property': 'data', 'value': 'sample'}],
+                'changedPropIds': ['upload-data.contents']
+            }, f)
+        del contents
+        
+        env = dict(os.environ, FLEET_DISK_CACHE_DIR=os.path.join(tmp, 'cache'))
+        result = {'csv_bytes': os.path.getsize(csv_path)}
+        for mode, path in [('upload-route', csv_path), ('dash-upload', body_path)]:
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--upload-memory-child', mode, path],
+                                       env=env, capture_output=True, text=True, check=True)
+            result[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result
+
+def environment():
+    import dash
+    import plotly
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'dash': dash.__version__,
+        'plotly': plotly.__version__
+    }
+
+# Сравнение с сохраненным прогоном: отношение времени новой версии к старой
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['vehicles'], r['months']): r for r in baseline['results']}
+    
+    print(f"\nСравнение с {baseline_path} (коммит {baseline['environment'].get('commit')}):")
+    for result in results:
+        old = previous.get((result['vehicles'], result['months']))
+        if old is None:
+            continue
+        print(f"  {result['vehicles']}x{result['months']}:")
+        for name, value in result['timings_ms'].items():
+            old_value = old['timings_ms'].get(name)
+            # Доли миллисекунды слишком шумные для сравнения
+            if old_value and max(old_value, value) >= 1:
+                ratio = value / old_value
+                flag = '  <-- медленнее' if ratio > 1.2 else ''
+                print(f"    {name:<40} {old_value:10.1f} -> {value:10.1f} мс  x{ratio:.2f}{flag}")
+
+def transport_cell(sizes):
+    compressed = f"br {sizes['br'] / 1024:.1f}" if 'br' in sizes else f"gzip {sizes['gzip'] / 1024:.1f}"
+    return f"{sizes['raw'] / 1024:.1f} / {compressed} КБ, {sizes['decode_ms']:.2f} мс"
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк дашборда автопарка")
+    parser.add_argument('--sizes', nargs='+', default=['100x12', '1000x36', '10000x36'],
+                        help="размеры в формате ТСxМесяцев")
+    parser.add_argument('--repeat', type=int, default=3, help="повторов, берется лучший")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--figure-workers', type=int, default=0,
+                        help="сравнить обновление дашборда без пула и с пулом из N исполнителей")
+    parser.add_argument('--figure-pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--transport', action='store_true',
+                        help="сравнить байты ответов графиков и время декодирования до и после сжатия")
+    parser.add_argument('--upload-memory', action='store_true',
+                        help="сравнить пиковую память загрузки через /upload и через dcc.Upload")
+    parser.add_argument('--upload-memory-child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.upload_memory_child:
+        upload_memory_child(*args.upload_memory_child)
+        return
+    
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    
+    results = []
+    for size in args.sizes:
+        n_vehicles, n_months = (int(part) for part in size.lower().split('x'))
+        result = run_size(app, n_vehicles, n_months, args.repeat, args.seed,
+                          args.figure_workers, args.figure_pool, args.transport)
+        results.append(result)
+        
+        print(f"{n_vehicles} ТС x {n_months} мес. = {result['rows']} строк, "
+              f"CSV {result['csv_bytes'] / 1024 / 1024:.1f} МБ, в памяти {result['dataset_bytes'] / 1024 / 1024:.1f} МБ")
+        for name, value in result['timings_ms'].items():
+            if name.endswith(':serialize'):
+                continue
+            size_info = f"{result['payload_bytes'][name] / 1024:9.1f} КБ" if name in result['payload_bytes'] else ''
+            print(f"  {name:<30} {value:10.1f} мс {size_info}")
+        
+        if args.transport:
+            print(f"  {'передача графиков':<30} {'обычный JSON':>36} {'компактный':>36}")
+            totals = {'plain': {}, 'compact': {}}
+            for figure_id, modes in result['transport'].items():
+                cells = []
+                for mode in ('plain', 'compact'):
+                    sizes = modes[mode]
+                    for name, value in sizes.items():
+                        totals[mode][name] = totals[mode].get(name, 0) + value
+                    cells.append(transport_cell(sizes))
+                print(f"    {figure_id:<28} {cells[0]:>36} {cells[1]:>36}")
+            print(f"    {'итого':<28} {transport_cell(totals['plain']):>36} {transport_cell(totals['compact']):>36}")
+        
+        if args.upload_memory:
+            memory = upload_memory(n_vehicles, n_months, args.seed)
+            result['upload_memory'] = memory
+            print(f"  пиковая память загрузки (CSV {memory['csv_bytes'] / 1024 / 1024:.1f} МБ, "
+                  f"набор {memory['upload-route']['dataset_bytes'] / 1024 / 1024:.1f} МБ):")
+            for mode in ('upload-route', 'dash-upload'):
+                print(f"    {mode:<28} {memory[mode]['peak_rss_bytes'] / 1024 / 1024:10.1f} МБ")
+    
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+# Конфигурация production-запуска: gunicorn -c gunicorn.conf.py app:server
+#
+# Несколько процессов-воркеров вместо однопоточного dev-сервера Dash, отладочные
+# инструменты выключены (app.run не вызывается). Наборы данных воркеры делят через
+# дисковый кэш Arrow (FLEET_DISK_CACHE_DIR), который читается через memory map,
+# поэтому N воркеров не держат N копий одного набора.
+import multiprocessing
+import os
+
+bind = os.environ.get('FLEET_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('FLEET_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('FLEET_THREADS', '4'))
+worker_class = 'gthread'
+
+# Приложение импортируется один раз в мастере до fork: воркеры разделяют его память
+preload_app = True
+
+# Разбор больших CSV может идти дольше стандартных 30 секунд
+timeout = int(os.environ.get('FLEET_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
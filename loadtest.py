@@ -0,0 +1,171 @@
+# Нагрузочный тест production-режима: пропускная способность в зависимости от числа воркеров.
+#
+#   python loadtest.py --csv fleet.csv --workers 1 2 4 --clients 16 --duration 10
+#
+# Набор данных загружается один раз в общий дисковый кэш, затем для каждого числа
+# воркеров поднимается gunicorn (gunicorn.conf.py) и клиенты в потоках вызывают
+# callback'и дашборда так же, как это делает браузер.
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Тела запросов к /_dash-update-component для callback'ов дашборда
+def callback_requests(key):
+    stored = {'id': 'stored-data', 'property': 'data', 'value': key}
+    # Без окна дат: весь набор
+    window = [{'id': 'date-range', 'property': 'start_date', 'value': None},
+              {'id': 'date-range', 'property': 'end_date', 'value': None}]
+    def simple(name, outputs):
+        return (name, {
+            'output': outputs[0] if len(outputs) == 1 else '..' + '...'.join(outputs) + '..',
+            'outputs': [{'id': o.split('.')[0], 'property': o.split('.')[1]} for o in outputs]
+            if len(outputs) > 1 else {'id': outputs[0].split('.')[0], 'property': outputs[0].split('.')[1]},
+            'inputs': [stored] + window,
+            'changedPropIds': ['stored-data.data']
+        })
+    
+    # Смена периода динамики выполняется в браузере, сервер отдает ряды всех периодов разом
+    requests = [simple('trend_data', ['trend-data.data'])]
+    requests.append(simple('type_figures', ['vehicle-type-distribution.figure', 'fuel-consumption.figure',
+                                            'maintenance-status.figure']))
+    requests.append(simple('cost', ['cost-breakdown.figure']))
+    requests.append(simple('scatter', ['age-vs-mileage.figure']))
+    requests.append(simple('kpis', ['total-vehicles.children', 'avg-mileage.children', 'utilization-rate.children',
+                                    'total-costs.children', 'data-info.children']))
+    return requests
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/_dash-layout')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def run_clients(port, requests, clients, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local = []
+        while time.perf_counter() < deadline:
+            name, body = rng.choice(requests)
+            started = time.perf_counter()
+            try:
+                conn.request('POST', '/_dash-update-component', json.dumps(body),
+                             {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    with lock:
+                        errors[0] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+    
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест дашборда под gunicorn")
+    parser.add_argument('--csv', default=os.path.join(ROOT, 'dash.csv'), help="CSV с данными автопарка")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=1, help="потоков на воркер")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+    
+    cache_dir = tempfile.mkdtemp(prefix='fleet-loadtest-')
+    os.environ['FLEET_DISK_CACHE_DIR'] = cache_dir
+    sys.path.insert(0, ROOT)
+    import app
+    
+    if app.pa is None:
+        sys.exit("Для общего кэша наборов между воркерами нужен pyarrow")
+    
+    with open(args.csv, 'rb') as f:
+        contents = 'data:text/csv;base64,' + base64.b64encode(f.read()).decode()
+    key = app.ingest_upload(contents, os.path.basename(args.csv))
+    if key is None:
+        sys.exit(f"Не удалось загрузить {args.csv}")
+    requests = callback_requests(key)
+    
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        env = dict(os.environ, FLEET_WORKERS=str(workers), FLEET_THREADS=str(args.threads),
+                   FLEET_BIND=f'127.0.0.1:{port}')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'app:server'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not wait_ready(port):
+                sys.exit("gunicorn не запустился")
+            # Прогрев: каждый воркер читает набор из дискового кэша
+            run_clients(port, requests, args.clients, min(2.0, args.duration))
+            result = run_clients(port, requests, args.clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        
+        result['workers'] = workers
+        results.append(result)
+        print(f"воркеров: {workers:>2}  запросов/с: {result['rps']:8.1f}  "
+              f"p50: {result['p50_ms']:7.1f} мс  p95: {result['p95_ms']:7.1f} мс  ошибок: {result['errors']}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'csv': args.csv, 'clients': args.clients, 'cpu_count': os.cpu_count(),
+                       'results': results}, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
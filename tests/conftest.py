@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Кэши и задачи тестов пишутся во временный каталог, а не рядом с app.py
+_cache_root = tempfile.mkdtemp(prefix='fleet-tests-')
+os.environ.setdefault('FLEET_DISK_CACHE_DIR', os.path.join(_cache_root, 'cache'))
+os.environ.setdefault('FLEET_JOBS_DIR', os.path.join(_cache_root, 'jobs'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
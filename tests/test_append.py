@@ -0,0 +1,112 @@
+# Дозапись месяца должна давать те же агрегаты, итоги и KPI, что и полный пересчет
+# по объединенному набору
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def fleet_rows(month, vehicles, **overrides):
+    n = len(vehicles)
+    rows = {
+        'date': pd.to_datetime([month] * n),
+        'vehicle_id': vehicles,
+        'vehicle_type': [['Легковой', 'Грузовой', 'Микроавтобус'][i % 3] for i in range(n)],
+        'mileage': [10000.0 + 1500 * i for i in range(n)],
+        'fuel_consumption': [8.0 + i for i in range(n)],
+        'fuel_cost': [20000.0 + 100 * i for i in range(n)],
+        'maintenance_cost': [5000.0 + 50 * i for i in range(n)],
+        'maintenance_status': [['Исправен', 'Требуется ТО'][i % 2] for i in range(n)],
+        'status': [['В работе', 'На ремонте'][i % 4 == 3] for i in range(n)],
+        'vehicle_age': [float(1 + i % 7) for i in range(n)]
+    }
+    rows.update(overrides)
+    return pd.DataFrame(rows)
+
+
+def base_rows():
+    vehicles = [f'V{i:03d}' for i in range(12)]
+    return pd.concat([fleet_rows(month, vehicles) for month in ['2024-01-01', '2024-02-01', '2024-03-01']],
+                     ignore_index=True)
+
+
+# Ожидаемый результат дозаписи: из нового файла остается последняя строка по ключу,
+# строки базы с теми же (date, vehicle_id) заменяются
+def merged_rows(base_df, new_df):
+    new_df = new_df.drop_duplicates(['date', 'vehicle_id'], keep='last')
+    new_keys = set(zip(new_df['date'], new_df['vehicle_id']))
+    kept = base_df[[key not in new_keys for key in zip(base_df['date'], base_df['vehicle_id'])]]
+    return pd.concat([kept, new_df], ignore_index=True)
+
+
+def assert_entries_match(incremental, full):
+    assert set(incremental['periods']) == set(full['periods'])
+    for name, expected in full['periods'].items():
+        actual = incremental['periods'][name]
+        # Колонки статусов, которых не осталось после замены, в дозаписи остаются нулевыми
+        extra = [col for col in actual.columns if col not in expected.columns]
+        assert (actual[extra] == 0).all().all(), name
+        actual = actual[expected.columns]
+        np.testing.assert_array_equal(np.asarray(actual.index), np.asarray(expected.index), err_msg=name)
+        np.testing.assert_allclose(actual.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64),
+                                   err_msg=name)
+    
+    assert set(incremental['totals']) == set(full['totals'])
+    for name, expected in full['totals'].items():
+        assert incremental['totals'][name] == pytest.approx(expected), name
+    
+    # Последняя строка KPI содержит объем в памяти, он зависит от набора категорий
+    assert app.build_kpis(incremental)[:4] == app.build_kpis(full)[:4]
+    assert len(incremental['df']) == len(full['df'])
+
+
+def check_append(base_df, new_df):
+    base = app.build_dataset_entry('base', base_df)
+    incremental = app.append_to_dataset(base, new_df, 'incremental')
+    full = app.build_dataset_entry('full', merged_rows(base_df, new_df))
+    assert_entries_match(incremental, full)
+    return incremental
+
+
+def test_append_new_month():
+    vehicles = [f'V{i:03d}' for i in range(12)]
+    incremental = check_append(base_rows(), fleet_rows('2024-04-01', vehicles))
+    assert len(incremental['df']) == 48
+
+
+def test_append_replaces_overlapping_keys():
+    # Исправленная выгрузка марта: те же ТС с другими значениями плюс новый месяц
+    vehicles = [f'V{i:03d}' for i in range(6)]
+    corrected = fleet_rows('2024-03-01', vehicles, mileage=[99000.0] * 6, status=['На ремонте'] * 6)
+    new_df = pd.concat([corrected, fleet_rows('2024-04-01', vehicles)], ignore_index=True)
+    incremental = check_append(base_rows(), new_df)
+    assert len(incremental['df']) == 36 + 6
+
+
+def test_append_deduplicates_new_file():
+    vehicles = [f'V{i:03d}' for i in range(4)]
+    first = fleet_rows('2024-04-01', vehicles)
+    second = fleet_rows('2024-04-01', vehicles[:2], mileage=[55555.0, 66666.0])
+    incremental = check_append(base_rows(), pd.concat([first, second], ignore_index=True))
+    april = incremental['df'][incremental['df']['date'] == pd.Timestamp('2024-04-01')]
+    assert len(april) == 4
+    assert sorted(april['mileage'].tolist())[-2:] == [55555, 66666]
+
+
+def test_append_new_categories():
+    new_df = fleet_rows('2024-04-01', ['V000', 'E001', 'E002'],
+                        vehicle_type=['Легковой', 'Электробус', 'Электробус'],
+                        maintenance_status=['Исправен', 'На ремонте', 'Списан'])
+    incremental = check_append(base_rows(), new_df)
+    assert 'Электробус' in incremental['periods']['vehicle_type'].index
+    assert isinstance(incremental['df']['vehicle_type'].dtype, pd.CategoricalDtype)
+    assert incremental['totals']['vehicles'] == 14
+
+
+def test_append_upload_rejects_broken_contents():
+    with mock.patch.object(app, 'get_dataset') as get_dataset:
+        assert app.append_upload('sample', 'data:text/csv;base64', 'april.csv') is None
+    get_dataset.assert_not_called()
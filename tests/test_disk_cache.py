@@ -0,0 +1,32 @@
+# Дисковый кэш наборов: обращения к набору в памяти продлевают жизнь его файлов
+import os
+
+import pandas as pd
+
+import app
+
+
+def test_memory_hits_touch_disk_files():
+    df = pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-01', '2024-02-01']),
+        'vehicle_id': ['A', 'B'],
+        'mileage': [1000.0, 2000.0]
+    })
+    key = app.register_dataset(df, app.content_key(b'touch-test'), persist=True)
+    paths = app._disk_cache_paths(key)
+    assert all(os.path.exists(path) for path in paths)
+    
+    old = os.path.getmtime(paths[0]) - 3600
+    for path in paths:
+        os.utime(path, (old, old))
+    with app._disk_cache_touch_lock:
+        app._disk_cache_touched.pop(key, None)
+    
+    assert app.get_dataset(key) is not None
+    assert os.path.getmtime(paths[0]) > old + 1800
+    
+    # Повторное обращение в пределах DISK_CACHE_TOUCH_SECONDS файлы не трогает
+    for path in paths:
+        os.utime(path, (old, old))
+    assert app.get_dataset(key) is not None
+    assert os.path.getmtime(paths[0]) == old
@@ -0,0 +1,38 @@
+# Кэш графиков: callback не ждет зависшее построение в пуле дольше FLEET_FIGURE_WAIT_SECONDS,
+# лимит памяти считается по разобранным объектам
+import json
+from unittest import mock
+
+import app
+
+
+def test_hung_pool_build_falls_back_to_local_build():
+    cache_key = app.figure_cache_key('hung-dataset', 'cost-breakdown', None)
+    pending, owner = app._claim_figure_build(cache_key)
+    assert owner
+    
+    try:
+        with mock.patch.object(app, 'FIGURE_WAIT_SECONDS', 0.05):
+            result = app.memoized('hung-dataset', 'cost-breakdown', None, lambda: {'built': 'locally'})
+        assert result == {'built': 'locally'}
+        assert app._figure_cache_get(cache_key) is not None
+    finally:
+        with app._figure_cache_lock:
+            app._figure_pending.pop(cache_key, None)
+        pending.cancel()
+
+
+def test_memory_limit_counts_decoded_objects():
+    payload = json.dumps({'data': [{'x': list(range(200)), 'name': f'trace {i}'} for i in range(5)]})
+    cache_key = app.figure_cache_key('size-dataset', 'fuel-consumption', None)
+    before = app.get_figure_cache_stats()['bytes']
+    
+    figure = app._figure_cache_put(cache_key, payload)
+    charged = app.get_figure_cache_stats()['bytes'] - before
+    assert charged == app.json_object_nbytes(figure)
+    # Разобранный объект заметно больше своего JSON
+    assert charged > 2 * len(payload)
+    
+    with mock.patch.object(app, 'FIGURE_CACHE_MAX_BYTES', charged + 1):
+        app._figure_cache_put(app.figure_cache_key('size-dataset', 'cost-breakdown', None), payload)
+    assert app._figure_cache_get(cache_key) is None
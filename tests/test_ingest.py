@@ -0,0 +1,57 @@
+# Разбор CSV: кодировка определяется по фрагменту, файл читается один раз
+import base64
+from unittest import mock
+
+import pandas as pd
+
+import app
+
+
+def read_passes(data):
+    calls = []
+    read_csv = pd.read_csv
+    
+    def counting_read_csv(*args, **kwargs):
+        if kwargs.get('nrows') != 0:
+            calls.append(kwargs.get('encoding'))
+        return read_csv(*args, **kwargs)
+    
+    with mock.patch.object(app.pd, 'read_csv', counting_read_csv):
+        df = app.parse_contents('data:text/csv;base64,' + base64.b64encode(data).decode(), 'fleet.csv')
+    return df, calls
+
+
+def fleet_csv(ascii_rows, tail):
+    lines = ['date,vehicle_id,vehicle_type,mileage,status']
+    lines += [f'2024-01-01,V{i:06d},Car,{i},ok' for i in range(ascii_rows)]
+    lines += [tail] * 10
+    return '\n'.join(lines)
+
+
+def test_utf8_parsed_once():
+    df, calls = read_passes(fleet_csv(1000, '2024-02-01,V1,Грузовой,10,В работе').encode('utf-8'))
+    assert calls == ['utf-8']
+    assert len(df) == 1010
+
+
+def test_cp1251_after_ascii_sample_skips_schema_retry_and_bom_variant():
+    # Первые 64 КБ - ASCII, поэтому по фрагменту выбирается utf-8, и ошибка кодировки
+    # появляется только в середине файла
+    data = fleet_csv(100000, '2024-02-01,V1,Грузовой,10,В работе').encode('cp1251')
+    assert app.detect_encoding(data) == 'utf-8'
+    df, calls = read_passes(data)
+    assert calls == ['utf-8', 'cp1251']
+    assert 'Грузовой' in df['vehicle_type'].cat.categories
+
+
+def test_non_numeric_values_fall_back_to_coerce():
+    df, calls = read_passes(fleet_csv(10, '2024-02-01,V1,Грузовой,н/д,В работе').encode('utf-8'))
+    assert calls == ['utf-8', 'utf-8']
+    assert len(df) == 20
+
+
+def test_broken_upload_contents_are_rejected_before_parsing():
+    with mock.patch.object(app, 'parse_csv_source') as parse_csv_source:
+        assert app.parse_contents('data:text/csv;base64', 'fleet.csv') is None
+        assert app.ingest_upload('data:text/csv;base64,не base64', 'fleet.csv') is None
+    parse_csv_source.assert_not_called()
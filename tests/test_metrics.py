@@ -0,0 +1,42 @@
+# /metrics: метки размеров ответов берутся только из зарегистрированных callback'ов
+import app
+
+
+def post_callback(client, output):
+    return client.post('/_dash-update-component', json={'output': output, 'outputs': {}, 'inputs': [],
+                                                         'changedPropIds': []})
+
+
+def response_size_labels():
+    with app._metrics_lock:
+        return set(app._histograms['fleet_response_size_bytes'])
+
+
+def test_unknown_outputs_share_one_label():
+    client = app.server.test_client()
+    before = response_size_labels()
+    for output in ['junk-1.figure', 'junk-2.figure', 'x"}\nfleet_dataset_cache_entries 999\n#']:
+        post_callback(client, output)
+    
+    assert response_size_labels() - before <= {'unknown'}
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'fleet_dataset_cache_entries 999' not in metrics
+    assert metrics.count('\nfleet_dataset_cache_entries ') == 1
+
+
+def test_registered_output_is_labelled_by_first_output():
+    client = app.server.test_client()
+    # Dash переносит callback'и в callback_map при первом запросе
+    client.get('/_dash-dependencies')
+    output = next(key for key in app.app.callback_map if key.startswith('..'))
+    post_callback(client, output)
+    assert output.strip('.').split('...')[0] in response_size_labels()
+
+
+def test_label_newlines_are_escaped():
+    app.observe('fleet_stage_duration_seconds', 'a\nb', 0.1)
+    try:
+        assert 'stage="a\\nb"' in app.render_metrics()
+    finally:
+        with app._metrics_lock:
+            app._histograms['fleet_stage_duration_seconds'].pop('a\nb', None)
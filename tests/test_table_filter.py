@@ -0,0 +1,94 @@
+# Разбор filter_query таблицы: операторы DataTable, префиксы регистра, типы колонок
+# и поведение неподдерживаемых операторов
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def fleet_table():
+    return pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-10-01', '2025-01-01']),
+        'vehicle_id': ['V1', 'V2', 'V3', 'V4'],
+        'vehicle_type': pd.Categorical(['Легковой', 'Грузовой', 'Грузовой', 'Микроавтобус']),
+        'status': ['В работе', 'на ремонте', '  ', None],
+        'mileage': [10000, 15000, 20000, 25000],
+        'fuel_consumption': np.array([8.2, 12.5, 20.1, np.nan], dtype=np.float32),
+    })
+
+
+def matched(filter_query):
+    df = fleet_table()
+    return df.loc[app.filter_query_mask(df, filter_query), 'vehicle_id'].tolist()
+
+
+@pytest.mark.parametrize('filter_query, expected', [
+    ('', ['V1', 'V2', 'V3', 'V4']),
+    ('{mileage} = 15000', ['V2']),
+    ('{mileage} eq 15000', ['V2']),
+    ('{mileage} != 15000', ['V1', 'V3', 'V4']),
+    ('{mileage} > 15000', ['V3', 'V4']),
+    ('{mileage} ge 15000', ['V2', 'V3', 'V4']),
+    ('{mileage} < 15000', ['V1']),
+    ('{mileage} le 15000', ['V1', 'V2']),
+    ('{mileage} >= 15000 && {mileage} lt 25000', ['V2', 'V3']),
+])
+def test_relational_operators(filter_query, expected):
+    assert matched(filter_query) == expected
+
+
+def test_float32_column_matches_displayed_value():
+    assert matched('{fuel_consumption} = 8.2') == ['V1']
+    assert matched('{fuel_consumption} > 12.5') == ['V3']
+
+
+def test_categorical_column():
+    assert matched('{vehicle_type} = "Грузовой"') == ['V2', 'V3']
+    assert matched('{vehicle_type} contains авто') == ['V4']
+    assert matched('{vehicle_type} ne Грузовой') == ['V1', 'V4']
+
+
+def test_case_prefixes():
+    assert matched('{status} = "в работе"') == []
+    assert matched('{status} ieq "в работе"') == ['V1']
+    assert matched('{status} icontains РЕМОНТ') == ['V2']
+    assert matched('{status} scontains РЕМОНТ') == []
+    assert matched('{vehicle_type} icontains груз') == ['V2', 'V3']
+
+
+@pytest.mark.parametrize('filter_query, expected', [
+    ('{date} datestartswith 2024', ['V1', 'V2', 'V3']),
+    ('{date} datestartswith 2024-0', ['V1', 'V2']),
+    ('{date} datestartswith 2024-1', ['V3']),
+    ('{date} datestartswith 2024-02-01', ['V2']),
+    ('{date} >= 2024-02-01', ['V2', 'V3', 'V4']),
+    ('{date} < 2024-10-01', ['V1', 'V2']),
+])
+def test_date_column(filter_query, expected):
+    assert matched(filter_query) == expected
+
+
+@pytest.mark.parametrize('filter_query, expected', [
+    ('{status} is blank', ['V3', 'V4']),
+    ('{status} is not blank', ['V1', 'V2']),
+    ('{status} is nil', ['V4']),
+    ('{fuel_consumption} is nil', ['V4']),
+    ('{fuel_consumption} is not nil', ['V1', 'V2', 'V3']),
+    ('{mileage} is even', ['V1', 'V2', 'V3', 'V4']),
+    ('{mileage} is odd', []),
+    ('{vehicle_type} is blank', []),
+])
+def test_unary_operators(filter_query, expected):
+    assert matched(filter_query) == expected
+
+
+@pytest.mark.parametrize('filter_query', [
+    '{mileage} is prime',
+    '{mileage} between 1 and 2',
+    '{unknown} = 1',
+    '{mileage} > много',
+    '{date} datestartswith 2024 && {mileage} is prime',
+])
+def test_unsupported_filter_matches_nothing(filter_query):
+    assert matched(filter_query) == []
@@ -0,0 +1,72 @@
+# Загрузка через dcc.Upload: разбор идет в фоновой задаче, пример данных выбирается в запросе
+import base64
+import os
+import re
+import time
+
+import pytest
+
+import app
+
+UPLOAD_OUTPUT = '..stored-data.data...error-message.children...error-message.style..'
+UPLOAD_OUTPUTS = [{'id': 'stored-data', 'property': 'data'},
+                  {'id': 'error-message', 'property': 'children'},
+                  {'id': 'error-message', 'property': 'style'}]
+
+
+def end_id(client):
+    # Токен сервера, которым браузер подписывает опросы фоновых задач
+    match = re.search(r'"end_id":\s*"([^"]*)"', client.get('/').get_data(as_text=True))
+    return match.group(1) if match else None
+
+
+def test_sample_button_is_answered_in_the_request():
+    client = app.server.test_client()
+    client.get('/_dash-dependencies')
+    # Выходы с allow_duplicate получают в ключе callback'а суффикс, поэтому ключ ищем по входу
+    output, spec = next((output, spec) for output, spec in app.app.callback_map.items()
+                        if [item['id'] for item in spec['inputs']] == ['load-sample'])
+    response = client.post('/_dash-update-component', json={
+        'output': output,
+        'outputs': [{'id': item.split('.')[0], 'property': item.split('.')[1].split('@')[0]}
+                    for item in output.strip('.').split('...')],
+        'inputs': [{'id': 'load-sample', 'property': 'n_clicks', 'value': 1}],
+        'changedPropIds': ['load-sample.n_clicks']
+    })
+    body = response.get_json()
+    assert 'cacheKey' not in body
+    assert body['response']['stored-data']['data'] == app.SAMPLE_DATASET_KEY
+
+
+@pytest.mark.skipif(app.INGEST_MANAGER is None, reason="нужны diskcache, multiprocess и pyarrow")
+def test_upload_job_runs_outside_the_worker_process():
+    client = app.server.test_client()
+    token = end_id(client)
+    with open(os.path.join(os.path.dirname(app.__file__), 'dash.csv'), 'rb') as f:
+        data = f.read()
+    body = {
+        'output': UPLOAD_OUTPUT,
+        'outputs': UPLOAD_OUTPUTS,
+        'inputs': [{'id': 'upload-data', 'property': 'contents',
+                    'value': 'data:text/csv;base64,' + base64.b64encode(data).decode()}],
+        'state': [{'id': 'upload-data', 'property': 'filename', 'value': 'fleet.csv'},
+                  {'id': 'upload-mode', 'property': 'value', 'value': 'replace'},
+                  {'id': 'stored-data', 'property': 'data', 'value': app.SAMPLE_DATASET_KEY}],
+        'changedPropIds': ['upload-data.contents']
+    }
+    suffix = f"&endId={token}" if token else ''
+    # Блокировка реестра занята в момент запуска задачи, как бывает при другом потоке воркера.
+    # Процесс, полученный через fork, унаследовал бы ее занятой и завис бы в get_dataset
+    with app._dataset_cache_lock:
+        job = client.post('/_dash-update-component' + (f"?endId={token}" if token else ''), json=body).get_json()
+    
+    deadline = time.time() + 30
+    result = None
+    while time.time() < deadline and result is None:
+        time.sleep(0.2)
+        response = client.post(f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}{suffix}",
+                               json=body).get_json()
+        result = response.get('response')
+    
+    assert result is not None, "фоновая задача не завершилась"
+    assert result['stored-data']['data'] == app.content_key(data)
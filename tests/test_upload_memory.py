@@ -0,0 +1,28 @@
+# Потоковая загрузка через /upload держит пик памяти в фиксированных пределах
+import json
+import os
+import subprocess
+import sys
+
+import benchmark
+
+# 20000 ТС x 36 месяцев: CSV около 66 МБ, набор в памяти около 21 МБ
+N_VEHICLES = 20000
+N_MONTHS = 36
+# Граница прироста пикового RSS, сейчас он около 100-130 МБ
+PEAK_LIMIT_MB = 192
+
+
+def test_upload_route_peak_memory_is_bounded(tmp_path):
+    csv_path = tmp_path / 'fleet.csv'
+    benchmark.generate_fleet(N_VEHICLES, N_MONTHS, 0).to_csv(csv_path, index=False)
+    
+    # Пик меряется в отдельном процессе: VmHWM текущего процесса pytest ничего не скажет
+    env = dict(os.environ, FLEET_DISK_CACHE_DIR=str(tmp_path / 'cache'))
+    completed = subprocess.run([sys.executable, benchmark.__file__, '--upload-memory-child', 'upload-route',
+                                str(csv_path)], env=env, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    
+    assert result['dataset_bytes'] > 0
+    assert result['peak_rss_bytes'] < PEAK_LIMIT_MB * 2 ** 20, (
+        f"пик {result['peak_rss_bytes'] / 2 ** 20:.0f} МБ при CSV {csv_path.stat().st_size / 2 ** 20:.0f} МБ")